@@ -0,0 +1,97 @@
+# batch_scheduler.py
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Most clips stacked into one Whisper forward pass; 0 (default) transcribes every clip on its own
+# with whisper's transcribe(), batches use greedy whisper.decode() with transcribe()'s fallback on rejects
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "0"))
+# How long the first clip of a batch waits for others to join
+WHISPER_BATCH_WAIT_MS = float(os.getenv("WHISPER_BATCH_WAIT_MS", "20"))
+
+RunBatch = Callable[[Hashable, List[Any]], Awaitable[List[Any]]]
+
+
+class BatchScheduler:
+    """
+    Collects items submitted under the same key and hands them to `run` in
+    batches of at most `max_size`. A batch is dispatched once it is full or
+    its first item has waited `max_wait` seconds. At most `concurrency`
+    batches run at a time; while they do, new items keep accumulating, so
+    under load batches fill up instead of queueing one by one behind the
+    running batch. Each caller gets back its own element of `run`'s result.
+    """
+
+    def __init__(self, run: RunBatch, max_size: int = WHISPER_BATCH_SIZE,
+                 max_wait: float = WHISPER_BATCH_WAIT_MS / 1000, concurrency: int = 1):
+        self.run = run
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait
+        self._slots = asyncio.Semaphore(concurrency)
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._scheduled: Set[Hashable] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((item, future))
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            if len(pending) >= self.max_size:
+                self._start(key)
+            else:
+                self._timers[key] = loop.call_later(self.max_wait, self._start, key)
+        elif len(pending) >= self.max_size and key in self._timers:
+            self._timers.pop(key).cancel()
+            self._start(key)
+        return await future
+
+    def _start(self, key: Hashable):
+        self._timers.pop(key, None)
+        task = asyncio.get_running_loop().create_task(self._dispatch(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, key: Hashable):
+        async with self._slots:
+            # Taken only once a slot is free, so everything that arrived meanwhile can join
+            pending = self._pending.pop(key, [])
+            batch = [(item, f) for item, f in pending[:self.max_size] if not f.cancelled()]
+            rest = pending[self.max_size:]
+            self._scheduled.discard(key)
+            if rest:
+                self._pending[key] = rest
+                self._scheduled.add(key)
+                self._start(key)
+            if not batch:
+                return
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = await self.run(key, [item for item, _ in batch])
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                return
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,104 @@
+"""
+Throughput vs latency of batched Whisper inference.
+
+Clients send the speech chunks of the bundled clips through the
+transcriber concurrently (closed loop: each sends its next clip when the
+previous one is answered). Every batch size runs the same workload on a
+Transcriber built as the service builds it, with the default queue limit
+for that batch size, so clips the service would turn away with 503 are
+counted as rejected. Batch size 0 is the unbatched path (one
+whisper.transcribe() call per clip).
+
+    python -m benchmarks.batch_bench
+    python -m benchmarks.batch_bench --batch-sizes 0,1,4,8 --concurrency 8 --wait-ms 20
+
+--no-fallback skips redoing low-confidence clips one by one. Use it when
+timing an untrained checkpoint (e.g. WHISPER_MODEL=/path/to/random.pt),
+whose every decode would otherwise be redone.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from transcriber import SAMPLE_RATE, Transcriber, TranscriberBusy, decode_audio
+from vad import speech_chunks
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FILES = [os.path.join(ROOT, "media", "audio1.mp3"), os.path.join(ROOT, "media", "audio2.mp3")]
+
+
+def load_clips(paths):
+    clips = []
+    for path in paths:
+        with open(path, "rb") as f:
+            clips += speech_chunks(decode_audio(f))
+    return clips
+
+
+async def run(engine: Transcriber, clips, requests: int, concurrency: int):
+    latencies = []
+    sent = rejected = 0
+
+    async def client():
+        nonlocal sent, rejected
+        while sent < requests:
+            clip = clips[sent % len(clips)]
+            sent += 1
+            started = time.perf_counter()
+            try:
+                await engine.transcribe_samples(clip)
+            except TranscriberBusy:
+                rejected += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, rejected
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def main_async(args):
+    clips = load_clips(args.files)
+    audio_seconds = sum(len(c) for c in clips) / SAMPLE_RATE
+    print(f"{len(clips)} clips, {audio_seconds:.1f}s of speech; {args.requests} requests, "
+          f"{args.concurrency} concurrent clients, max wait {args.wait_ms:g} ms")
+
+    print(f"{'batch':>6}{'queue':>7}{'clips/s':>10}{'x rt':>8}{'mean batch':>12}{'p50 s':>9}{'p95 s':>9}"
+          f"{'max s':>9}{'503s':>7}")
+    for size in args.batch_sizes:
+        engine = Transcriber(pool_size=0, batch_size=size, batch_wait_ms=args.wait_ms)
+        engine.batch_fallback = not args.no_fallback
+        engine.load()
+        await engine.transcribe_samples(clips[0])  # warm-up
+        elapsed, latencies, rejected = await run(engine, clips, args.requests, args.concurrency)
+        done = len(latencies)
+        mean_batch = engine._batcher.mean_batch_size if engine._batcher else 1.0
+        rt = audio_seconds * done / len(clips) / elapsed
+        print(f"{size or 'off':>6}{engine.queue_limit:>7}{done / elapsed:>10.2f}{rt:>8.1f}{mean_batch:>12.2f}"
+              f"{statistics.median(latencies):>9.2f}{percentile(latencies, 0.95):>9.2f}{max(latencies):>9.2f}"
+              f"{rejected:>7}")
+        engine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", default=DEFAULT_FILES)
+    parser.add_argument("--batch-sizes", type=lambda s: [int(x) for x in s.split(",")], default=[0, 1, 2, 4, 8])
+    parser.add_argument("--wait-ms", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--no-fallback", action="store_true", help="don't redo low-confidence clips one by one")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
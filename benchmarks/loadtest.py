@@ -0,0 +1,370 @@
+"""
+End-to-end load test for the FastAPI service.
+
+Drives /api/chat, /api/trip/create and /api/voice/process with a weighted
+mix, either closed-loop (N concurrent virtual users) or open-loop (Poisson
+arrivals at a fixed rate), and reports throughput, latency percentiles,
+error rate and the server's event-loop lag (sampled from /health).
+
+By default it spawns the mock upstream and the app locally, so it runs
+offline:
+
+    python -m benchmarks.loadtest --concurrency 32 --duration 30
+    python -m benchmarks.loadtest --rate 50 --duration 30 --mix chat=1
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 ...   # existing server
+
+Save a baseline, then compare later runs against it (exit code 1 on regression):
+
+    python -m benchmarks.loadtest --save-baseline baseline.json
+    python -m benchmarks.loadtest --compare baseline.json --tolerance 0.15
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CITIES = ["Berlin", "Paris", "Rome", "Lisbon", "Vienna", "Prague", "Madrid", "Amsterdam"]
+CHAT_PROMPTS = [
+    "hi", "thanks!", "What should I see in {city}?", "Find me a hotel in {city} under 150 euro",
+    "How do I get from the airport to the centre of {city}?", "Is {city} expensive for food?",
+]
+
+
+class Endpoint:
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+
+    def body(self, rng: random.Random, unique: bool, audio_b64: Optional[str]) -> dict:
+        city = rng.choice(CITIES)
+        suffix = f" (#{rng.getrandbits(32)})" if unique else ""
+        if self.name == "chat":
+            prompt = rng.choice(CHAT_PROMPTS).format(city=city) + suffix
+            return {"messages": [{"role": "user", "content": prompt}]}
+        if self.name == "trip":
+            days, group = rng.randint(1, 7), rng.randint(1, 5)
+            return {"user_id": "loadtest", "conversation": f"{days} days in {city} for {group}{suffix}"}
+        if audio_b64 is not None:
+            return {"audio_base64": audio_b64}
+        return {"text": f"Plan a weekend in {city}{suffix}"}
+
+
+ENDPOINTS = {
+    "chat": Endpoint("chat", "/api/chat"),
+    "trip": Endpoint("trip", "/api/trip/create"),
+    "voice": Endpoint("voice", "/api/voice/process"),
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.errors: Dict[str, int] = Counter()
+        self.server_lag: List[dict] = []
+        self.client_lag: List[float] = []
+
+    def record(self, name: str, seconds: float, status: str, ok: bool):
+        self.latencies[name].append(seconds)
+        self.statuses[name][status] += 1
+        if not ok:
+            self.errors[name] += 1
+
+
+async def _fire(client: httpx.AsyncClient, endpoint: Endpoint, body: dict, headers: dict, recorder: Recorder):
+    started = time.perf_counter()
+    try:
+        resp = await client.post(endpoint.path, json=body, headers=headers)
+        status, ok = str(resp.status_code), resp.status_code < 400
+    except httpx.HTTPError as exc:
+        status, ok = type(exc).__name__, False
+    recorder.record(endpoint.name, time.perf_counter() - started, status, ok)
+
+
+def _pick(rng: random.Random, mix: Dict[str, float]) -> Endpoint:
+    return ENDPOINTS[rng.choices(list(mix), weights=list(mix.values()))[0]]
+
+
+async def closed_loop(client, args, mix, recorder, audio_b64, headers):
+    deadline = time.perf_counter() + args.duration
+
+    async def user(seed: int):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            endpoint = _pick(rng, mix)
+            await _fire(client, endpoint, endpoint.body(rng, rng.random() < args.unique_ratio, audio_b64),
+                        headers, recorder)
+
+    await asyncio.gather(*(user(args.seed + i) for i in range(args.concurrency)))
+
+
+async def open_loop(client, args, mix, recorder, audio_b64, headers):
+    rng = random.Random(args.seed)
+    deadline = time.perf_counter() + args.duration
+    inflight = set()
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        if len(inflight) >= args.max_inflight:
+            recorder.record("dropped", 0.0, "client_overload", False)
+        else:
+            endpoint = _pick(rng, mix)
+            body = endpoint.body(rng, rng.random() < args.unique_ratio, audio_b64)
+            task = asyncio.ensure_future(_fire(client, endpoint, body, headers, recorder))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        next_at += rng.expovariate(args.rate)
+    if inflight:
+        await asyncio.wait(inflight)
+
+
+async def sample_lag(client: httpx.AsyncClient, recorder: Recorder, stop: asyncio.Event):
+    """Poll the server's loop-lag gauge, and measure our own loop to flag a saturated client."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            resp = await client.get("/health", params={"reset_lag": "true"})
+            lag = resp.json().get("event_loop_lag")
+            if lag:
+                recorder.server_lag.append(lag)
+        except (httpx.HTTPError, ValueError):
+            pass
+        await asyncio.sleep(max(0.0, 1.0 - (time.perf_counter() - started)))
+        t0 = time.perf_counter()
+        await asyncio.sleep(0)
+        recorder.client_lag.append(time.perf_counter() - t0)
+
+
+def _percentiles(samples: List[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    arr = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "mean_ms": float(arr.mean()),
+        "max_ms": float(arr.max()),
+    }
+
+
+def summarize(recorder: Recorder, elapsed: float, args) -> dict:
+    endpoints = {}
+    total = errors = 0
+    for name in sorted(recorder.latencies):
+        count = len(recorder.latencies[name])
+        total += count
+        errors += recorder.errors[name]
+        endpoints[name] = {
+            **_percentiles(recorder.latencies[name]),
+            "throughput_rps": count / elapsed,
+            "error_rate": recorder.errors[name] / count if count else 0.0,
+            "statuses": dict(recorder.statuses[name]),
+        }
+    all_latencies = [s for name, v in recorder.latencies.items() if name != "dropped" for s in v]
+    server_max = [lag["max_ms"] for lag in recorder.server_lag]
+    server_mean = [lag["mean_ms"] for lag in recorder.server_lag]
+    return {
+        "config": {
+            "mode": "open" if args.rate else "closed",
+            "concurrency": args.concurrency, "rate": args.rate, "duration": args.duration,
+            "mix": args.mix, "unique_ratio": args.unique_ratio,
+        },
+        "elapsed_s": elapsed,
+        "requests": total,
+        "throughput_rps": total / elapsed,
+        "error_rate": errors / total if total else 0.0,
+        "latency": _percentiles(all_latencies),
+        "endpoints": endpoints,
+        "event_loop_lag": {
+            "server_max_ms": max(server_max, default=0.0),
+            "server_mean_ms": float(np.mean(server_mean)) if server_mean else 0.0,
+            "client_max_ms": max(recorder.client_lag, default=0.0) * 1000,
+        },
+    }
+
+
+def print_report(result: dict):
+    print(f"\n{result['config']['mode']}-loop run: {result['requests']} requests in {result['elapsed_s']:.1f}s "
+          f"-> {result['throughput_rps']:.1f} req/s, error rate {result['error_rate']:.2%}")
+    print(f"{'endpoint':<10}{'count':>8}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err':>8}")
+    rows = list(result["endpoints"].items()) + [("all", {**result["latency"], "throughput_rps": result["throughput_rps"],
+                                                         "error_rate": result["error_rate"]})]
+    for name, stats in rows:
+        if not stats.get("count"):
+            continue
+        print(f"{name:<10}{stats['count']:>8}{stats['throughput_rps']:>8.1f}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['error_rate']:>8.2%}")
+    lag = result["event_loop_lag"]
+    print(f"event-loop lag: server max {lag['server_max_ms']:.1f} ms, mean {lag['server_mean_ms']:.2f} ms; "
+          f"client max {lag['client_max_ms']:.1f} ms")
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of `result` against `baseline`, as human-readable lines."""
+    regressions = []
+    # Open-loop throughput is fixed by --rate, so it is only comparable between closed-loop runs
+    compare_throughput = result["config"]["mode"] == baseline.get("config", {}).get("mode") == "closed"
+    for name, base in baseline.get("endpoints", {}).items():
+        current = result["endpoints"].get(name)
+        if not current or not base.get("count"):
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {base[key]:.1f} -> {current[key]:.1f}")
+        if compare_throughput and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name} throughput: {base['throughput_rps']:.1f} -> {current['throughput_rps']:.1f} rps")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{name} error rate: {base['error_rate']:.2%} -> {current['error_rate']:.2%}")
+    return regressions
+
+
+def _wait_healthy(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become healthy within {timeout:.0f}s")
+
+
+def spawn_stack(args) -> List[subprocess.Popen]:
+    """Start the mock upstream and the app as subprocesses."""
+    mock_port, app_port = args.mock_port, args.app_port
+    mock = subprocess.Popen(
+        [sys.executable, "mock_openai_server.py", "--port", str(mock_port), "--latency", args.mock_latency,
+         "--tokens-per-second", str(args.mock_tokens_per_second), "--error-rate", str(args.mock_error_rate),
+         "--seed", str(args.seed)],
+        cwd=ROOT,
+    )
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "loadtest"),
+        # The harness measures the service, not our client-side quota
+        "OPENAI_RPM_LIMIT": os.getenv("OPENAI_RPM_LIMIT", "0"),
+        "OPENAI_TPM_LIMIT": os.getenv("OPENAI_TPM_LIMIT", "0"),
+    }
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning",
+         "--workers", str(args.workers)],
+        cwd=ROOT, env=env,
+    )
+    procs = [mock, app]
+    try:
+        _wait_healthy(f"http://127.0.0.1:{mock_port}/health")
+        _wait_healthy(f"http://127.0.0.1:{app_port}/health")
+    except Exception:
+        stop_stack(procs)
+        raise
+    return procs
+
+
+def stop_stack(procs: List[subprocess.Popen]):
+    for proc in reversed(procs):
+        proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def run(args) -> dict:
+    mix = {k: float(v) for k, v in (item.split("=") for item in args.mix.split(","))}
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    audio_b64 = None
+    if mix.get("voice") and args.voice_audio:
+        with open(args.voice_audio, "rb") as f:
+            audio_b64 = base64.b64encode(f.read()).decode()
+    headers = {"X-Cache-Bypass": "1"} if args.no_cache else {}
+
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.max_inflight) + 8)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        await client.get("/health", params={"reset_lag": "true"})
+        recorder = Recorder()
+        stop = asyncio.Event()
+        sampler = asyncio.ensure_future(sample_lag(client, recorder, stop))
+        started = time.perf_counter()
+        if args.rate:
+            await open_loop(client, args, mix, recorder, audio_b64, headers)
+        else:
+            await closed_loop(client, args, mix, recorder, audio_b64, headers)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+    return summarize(recorder, elapsed, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target an already running service instead of spawning one")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=16, help="closed loop: concurrent virtual users")
+    parser.add_argument("--rate", type=float, default=0.0, help="open loop: mean arrivals per second")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="open loop: drop arrivals beyond this")
+    parser.add_argument("--mix", default="chat=0.6,trip=0.3,voice=0.1")
+    parser.add_argument("--unique-ratio", type=float, default=1.0, help="fraction of requests with unique prompts")
+    parser.add_argument("--no-cache", action="store_true", help="send X-Cache-Bypass on every request")
+    parser.add_argument("--voice-audio", default=os.path.join(ROOT, "media", "audio1.mp3"))
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when spawning")
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--mock-port", type=int, default=8101)
+    parser.add_argument("--mock-latency", default="lognormal:-1.6,0.5")
+    parser.add_argument("--mock-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="write the full result JSON here")
+    parser.add_argument("--save-baseline", help="write the result JSON as a baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args()
+
+    procs = []
+    if not args.url:
+        procs = spawn_stack(args)
+        args.url = f"http://127.0.0.1:{args.app_port}"
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        stop_stack(procs)
+
+    print_report(result)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"wrote {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS vs baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nno regressions vs baseline")
+
+
+if __name__ == "__main__":
+    main()
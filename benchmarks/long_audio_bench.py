@@ -0,0 +1,82 @@
+"""
+Wall-clock time of one long voice note: sequential vs parallel windows.
+
+Builds a note of --minutes by repeating the bundled clips, writes it to a
+WAV file and transcribes it with Transcriber.transcribe_file(), as
+utils.transcribe() does. "seq" is the prompted one-window-after-another
+path; "pool N" splits the note into overlapping windows and transcribes
+them on N worker processes; "batch N" stacks them in-process, N at a time.
+
+    python -m benchmarks.long_audio_bench
+    python -m benchmarks.long_audio_bench --minutes 5 --pools 2,4,8 --batch 8
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from transcriber import SAMPLE_RATE, Transcriber, decode_audio
+from transcript_cache import transcript_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FILES = [os.path.join(ROOT, "media", "audio1.mp3"), os.path.join(ROOT, "media", "audio2.mp3")]
+
+
+def long_note(paths, minutes: float) -> np.ndarray:
+    clips = []
+    for path in paths:
+        with open(path, "rb") as f:
+            clips.append(decode_audio(f))
+    reps = max(1, int(np.ceil(minutes * 60 * SAMPLE_RATE / sum(len(c) for c in clips))))
+    return np.concatenate(clips * reps)[:int(minutes * 60 * SAMPLE_RATE)]
+
+
+def write_wav(audio: np.ndarray) -> str:
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    with os.fdopen(fd, "wb") as f, wave.open(f, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+        out.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+    return path
+
+
+def timed(label: str, engine: Transcriber, path: str, baseline: float = None) -> float:
+    engine.load()
+    transcript_cache.clear()  # every configuration transcribes the same file
+    started = time.perf_counter()
+    text = engine.transcribe_file(path)
+    elapsed = time.perf_counter() - started
+    engine.close()
+    speedup = f"{baseline / elapsed:>8.2f}x" if baseline else f"{'':>9}"
+    print(f"{label:<10}{elapsed:>9.2f}{speedup}{len(text.split()):>8}  {text[:60]!r}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", default=DEFAULT_FILES)
+    parser.add_argument("--minutes", type=float, default=2.0)
+    parser.add_argument("--pools", type=lambda s: [int(x) for x in s.split(",")], default=[2, 4])
+    parser.add_argument("--batch", type=int, default=0, help="also time in-process batches of this size")
+    args = parser.parse_args()
+
+    path = write_wav(long_note(args.files, args.minutes))
+    try:
+        print(f"{args.minutes:g} min note, {os.cpu_count()} CPUs")
+        print(f"{'mode':<10}{'seconds':>9}{'speedup':>9}{'words':>8}")
+        baseline = timed("seq", Transcriber(pool_size=0, batch_size=0), path)
+        for size in args.pools:
+            timed(f"pool {size}", Transcriber(pool_size=size, batch_size=0), path, baseline)
+        if args.batch:
+            timed(f"batch {args.batch}", Transcriber(pool_size=0, batch_size=args.batch), path, baseline)
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
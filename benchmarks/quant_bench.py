@@ -0,0 +1,112 @@
+"""
+Real-time factor and transcript drift of the Whisper backends.
+
+Transcribes each clip in media/ with every backend (same WHISPER_MODEL,
+in-process) and reports the RTF (inference seconds per audio second,
+best of --repeat runs) and the drift: word-level edit distance from the
+first backend's transcript (fp32 by default), per reference word. No
+reference transcripts ship for the media/ clips, so drift shows what
+quantization changes, not how accurate either backend is. Pass
+--references, a JSON file mapping clip file names to their true
+transcripts, to report WER against them instead.
+
+    python -m benchmarks.quant_bench
+    python -m benchmarks.quant_bench --backends fp32,int8 --references refs.json
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from transcriber import BACKENDS, SAMPLE_RATE, Transcriber, decode_audio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FILES = [os.path.join(ROOT, "media", "audio1.mp3"), os.path.join(ROOT, "media", "audio2.mp3")]
+
+
+def normalize(text: str):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def wer(reference: str, hypothesis: str) -> float:
+    """Word-level Levenshtein distance divided by the reference length."""
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1] / max(1, len(ref))
+
+
+def run_backend(backend: str, clips, repeat: int, fallback: bool):
+    engine = Transcriber(pool_size=0, batch_size=0, backend=backend)
+    started = time.perf_counter()
+    engine.load()
+    load_seconds = time.perf_counter() - started
+    results = {}
+    for name, audio in clips.items():
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            if fallback:
+                text = engine.transcribe_pcm(audio)
+            else:
+                text = engine.transcribe_batch([audio], fallback=False)[0]
+            best = min(best, time.perf_counter() - started)
+        results[name] = (text, best)
+    engine.close()
+    return load_seconds, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", default=DEFAULT_FILES)
+    parser.add_argument("--backends", type=lambda s: s.split(","), default=list(BACKENDS))
+    parser.add_argument("--references", help="JSON file: {clip file name: transcript}; reports WER instead of drift")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-fallback", action="store_true",
+                        help="one greedy decode per clip (for timing untrained checkpoints)")
+    args = parser.parse_args()
+
+    clips = {}
+    for path in args.files:
+        with open(path, "rb") as f:
+            clips[os.path.basename(path)] = decode_audio(f)
+    references = None
+    if args.references:
+        with open(args.references) as f:
+            references = json.load(f)
+        missing = sorted(name for name in clips if name not in references)
+        if missing:
+            parser.error(f"no reference transcript for {', '.join(missing)}")
+
+    runs = {b: run_backend(b, clips, args.repeat, not args.no_fallback) for b in args.backends}
+    metric = "WER"
+    if references is None:
+        references = {name: text for name, (text, _) in runs[args.backends[0]][1].items()}
+        metric = "drift"
+        print(f"drift: word edit distance from the {args.backends[0]} transcripts (not WER; no --references)")
+
+    print(f"{'backend':<9}{'clip':<14}{'audio s':>9}{'infer s':>9}{'RTF':>7}{metric:>8}")
+    for backend, (load_seconds, results) in runs.items():
+        audio_total = infer_total = errors = words = 0.0
+        for name, (text, seconds) in results.items():
+            audio_seconds = len(clips[name]) / SAMPLE_RATE
+            clip_wer = wer(references[name], text)
+            ref_words = max(1, len(normalize(references[name])))
+            audio_total += audio_seconds
+            infer_total += seconds
+            errors += clip_wer * ref_words
+            words += ref_words
+            print(f"{backend:<9}{name:<14}{audio_seconds:>9.2f}{seconds:>9.2f}{seconds / audio_seconds:>7.3f}"
+                  f"{clip_wer:>8.1%}")
+        print(f"{backend:<9}{'total':<14}{audio_total:>9.2f}{infer_total:>9.2f}{infer_total / audio_total:>7.3f}"
+              f"{errors / words:>8.1%}   (load {load_seconds:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Offline benchmark for the trip-plan semantic cache.
+
+Seeds the cache with one phrasing per trip intent, then queries with other
+phrasings of the same intents (should hit) and with intents that differ only
+in city or numbers (must miss). Then does the same with long requests whose
+near-misses differ by one word or clause: another month, a negation, a
+swapped activity, an extra constraint or an extra requirement ("vegan").
+Reports hit rate, false-hit rate and lookup latency.
+
+    python -m benchmarks.semantic_cache_bench --intents 2000 --threshold 0.85
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+CITIES = [
+    "Berlin", "Paris", "Rome", "Madrid", "Lisbon", "Vienna", "Prague", "Amsterdam",
+    "Barcelona", "Munich", "Budapest", "Copenhagen", "Stockholm", "Dublin", "Athens",
+    "Istanbul", "London", "Edinburgh", "Zurich", "Warsaw", "Krakow", "Oslo", "Helsinki",
+    "Brussels", "Milan", "Florence", "Venice", "Seville", "Porto", "Hamburg",
+]
+STYLES = ["", "on a budget", "with museums", "with good food", "with nightlife", "relaxed"]
+MONTHS = ["March", "April", "May", "June", "July", "August", "September", "October"]
+ACTIVITIES = ["food tours", "wine tours", "bike tours", "walking tours", "cooking classes"]
+REQUIREMENTS = [", with kids", " vegan", ", wheelchair accessible", ", cheap", " luxury", ", with pets", ", dog friendly"]
+
+LONG_TEMPLATES = [
+    "A week in {city} for {group} people in {month} including museums and {activity}",
+    "Plan a week in {city} for {group} people in {month}, including museums and {activity} please",
+    "We are {group} travellers going to {city} for a week in {month}, with museums and {activity} included",
+]
+
+def _other(values, value, rng):
+    return rng.choice([v for v in values if v != value])
+
+
+# Each returns the changed request and its intent (None when no cached intent can match it)
+LONG_NEAR_MISSES = [
+    ("month", lambda i, rng: {**i, "month": _other(MONTHS, i["month"], rng)}),
+    ("negation", lambda i, rng: (long_phrase(LONG_TEMPLATES[0], **i).replace("including", "excluding"), None)),
+    ("activity", lambda i, rng: {**i, "activity": _other(ACTIVITIES, i["activity"], rng)}),
+    ("constraint", lambda i, rng: (long_phrase(LONG_TEMPLATES[0], **i) + ", no flights", None)),
+    # Extra requirements that are ordinary content words, not negations
+    ("requirement", lambda i, rng: (long_phrase(LONG_TEMPLATES[0], **i) + rng.choice(REQUIREMENTS), None)),
+]
+NUMBER_WORDS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"]
+
+TEMPLATES = [
+    "{days} days in {city} for {group} {style}",
+    "Plan a {days} day trip to {city} for {group} people {style}",
+    "{group_w} of us, {city}, {days_w} days {style}",
+    "We are {group} travellers going to {city} for {days} days {style}",
+    "Trip to {city}: {days_w} days, {group_w} people {style}",
+]
+
+
+def phrase(template: str, city: str, days: int, group: int, style: str) -> str:
+    return template.format(
+        city=city, days=days, group=group, style=style,
+        days_w=NUMBER_WORDS[days], group_w=NUMBER_WORDS[group],
+    ).strip()
+
+
+def long_phrase(template: str, city: str, group: int, month: str, activity: str) -> str:
+    return template.format(city=city, group=group, month=month, activity=activity)
+
+
+def long_requests(rng: random.Random, count: int, threshold):
+    """Hit rate on paraphrases and false hits per near-miss kind, for long requests."""
+    intents = set()
+    while len(intents) < count:
+        intents.add((rng.choice(CITIES), rng.randint(2, 6), rng.choice(MONTHS), rng.choice(ACTIVITIES)))
+    intents = [dict(zip(("city", "group", "month", "activity"), i)) for i in sorted(intents)]
+    cache = SemanticCache(capacity=len(intents))
+    if threshold is not None:
+        cache.threshold = threshold
+    for index, intent in enumerate(intents):
+        cache.insert(long_phrase(LONG_TEMPLATES[0], **intent), index)
+
+    hits = 0
+    for index, intent in enumerate(intents):
+        result = cache.lookup(long_phrase(rng.choice(LONG_TEMPLATES[1:]), **intent))
+        hits += result is not None and result[0] == index
+    print(f"long paraphrases:   {hits}/{len(intents)} hits ({hits / len(intents):.1%})")
+    index_of = {tuple(intent.values()): index for index, intent in enumerate(intents)}
+    for kind, make in LONG_NEAR_MISSES:
+        false_hits = 0
+        for intent in intents:
+            changed = make(intent, rng)
+            if isinstance(changed, dict):
+                changed = long_phrase(LONG_TEMPLATES[0], **changed), index_of.get(tuple(changed.values()))
+            query, expected = changed
+            result = cache.lookup(query)
+            # Landing on another cached intent that really is this request is a correct hit
+            false_hits += result is not None and result[0] != expected
+        print(f"long {kind + ':':<14}{false_hits}/{len(intents)} wrong-intent hits")
+
+
+def percentile(samples, q):
+    return float(np.percentile(np.asarray(samples), q)) * 1e6  # microseconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--intents", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    intents = set()
+    while len(intents) < args.intents:
+        intents.add((rng.choice(CITIES), rng.randint(1, 10), rng.randint(1, 6), rng.choice(STYLES)))
+    intents = sorted(intents)
+
+    cache = SemanticCache(capacity=len(intents))
+    if args.threshold is not None:
+        cache.threshold = args.threshold
+
+    start = time.perf_counter()
+    for intent in intents:
+        cache.insert(phrase(TEMPLATES[0], *intent), intent)
+    insert_seconds = time.perf_counter() - start
+
+    latencies, hits, false_hits = [], 0, 0
+    misses_expected, false_hits_negative = 0, 0
+    for _ in range(args.queries):
+        intent = rng.choice(intents)
+        if rng.random() < 0.8:
+            # Paraphrase of a cached intent
+            query, expected = phrase(rng.choice(TEMPLATES[1:]), *intent), intent
+        else:
+            # Same shape, different city or days: must not be served from cache
+            city, days, group, style = intent
+            if rng.random() < 0.5:
+                city = rng.choice([c for c in CITIES if c != city])
+            else:
+                days = days % 10 + 1
+            query, expected = phrase(rng.choice(TEMPLATES), city, days, group, style), None
+
+        t0 = time.perf_counter()
+        result = cache.lookup(query)
+        latencies.append(time.perf_counter() - t0)
+
+        if expected is None:
+            misses_expected += 1
+            if result is not None and result[0] != (city, days, group, style):
+                false_hits_negative += 1
+        elif result is not None:
+            if result[0] == expected:
+                hits += 1
+            else:
+                false_hits += 1
+
+    paraphrases = args.queries - misses_expected
+    print(f"entries:            {len(cache)} (dim={cache.embedder.dim}, threshold={cache.threshold})")
+    print(f"insert:             {insert_seconds / len(intents) * 1e6:.1f} us/entry")
+    print(f"paraphrase hits:    {hits}/{paraphrases} ({hits / max(paraphrases, 1):.1%})")
+    print(f"wrong-intent hits:  {false_hits + false_hits_negative} "
+          f"({false_hits} on paraphrases, {false_hits_negative}/{misses_expected} on near-misses)")
+    print(f"lookup latency:     p50={percentile(latencies, 50):.0f} us  "
+          f"p95={percentile(latencies, 95):.0f} us  p99={percentile(latencies, 99):.0f} us")
+    long_requests(rng, min(args.intents, 500), args.threshold)
+
+
+if __name__ == "__main__":
+    main()
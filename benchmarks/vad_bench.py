@@ -0,0 +1,87 @@
+"""
+Benchmark for the VAD stage in front of Whisper.
+
+Decodes the bundled clips, runs the VAD, and reports how many audio seconds
+still reach the model, how the speech is chunked, and what the VAD costs.
+--pad-seconds adds recorder-like room noise before and after each clip, which
+is what browser recordings usually look like. --transcribe also times the
+configured WHISPER_MODEL on the whole clip and on the VAD chunks.
+
+    python -m benchmarks.vad_bench
+    python -m benchmarks.vad_bench --pad-seconds 3 --transcribe
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from transcriber import SAMPLE_RATE, Transcriber, decode_audio
+from vad import speech_chunks, speech_segments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FILES = [os.path.join(ROOT, "media", "audio1.mp3"), os.path.join(ROOT, "media", "audio2.mp3")]
+
+
+def with_room_noise(audio: np.ndarray, seconds: float, level_db: float, rng: np.random.Generator) -> np.ndarray:
+    if seconds <= 0:
+        return audio
+    n = int(seconds * SAMPLE_RATE)
+    noise = lambda: (rng.standard_normal(n) * 10 ** (level_db / 20)).astype(np.float32)  # noqa: E731
+    return np.concatenate([noise(), audio, noise()])
+
+
+def time_vad(audio: np.ndarray, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        speech_chunks(audio)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", default=DEFAULT_FILES)
+    parser.add_argument("--pad-seconds", type=float, default=0.0, help="room noise added before and after")
+    parser.add_argument("--noise-db", type=float, default=-65.0)
+    parser.add_argument("--repeat", type=int, default=50, help="VAD runs per clip for timing")
+    parser.add_argument("--transcribe", action="store_true", help="also time Whisper with and without VAD")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    engine = None
+    if args.transcribe:
+        engine = Transcriber(pool_size=0)
+        engine.load()
+
+    total_in = total_out = 0.0
+    print(f"{'clip':<12}{'seconds':>9}{'speech':>9}{'cut':>8}{'segments':>10}{'chunks':>8}{'vad ms':>9}{'x rt':>9}")
+    for path in args.files:
+        with open(path, "rb") as f:
+            audio = with_room_noise(decode_audio(f), args.pad_seconds, args.noise_db, rng)
+        seconds = len(audio) / SAMPLE_RATE
+        chunks = speech_chunks(audio)
+        speech = sum(len(c) for c in chunks) / SAMPLE_RATE
+        elapsed = time_vad(audio, args.repeat)
+        total_in += seconds
+        total_out += speech
+        print(f"{os.path.basename(path):<12}{seconds:>9.2f}{speech:>9.2f}{1 - speech / seconds:>8.1%}"
+              f"{len(speech_segments(audio)):>10}{len(chunks):>8}{elapsed * 1000:>9.2f}{seconds / elapsed:>9.0f}")
+
+        if engine is not None:
+            started = time.perf_counter()
+            full = engine.transcribe_pcm(audio)
+            full_time = time.perf_counter() - started
+            started = time.perf_counter()
+            trimmed = " ".join(engine.transcribe_pcm(c) for c in chunks)
+            vad_time = time.perf_counter() - started
+            print(f"    whisper: {full_time:.2f}s on the whole clip, {vad_time:.2f}s on VAD chunks")
+            print(f"    whole: {full!r}")
+            print(f"    vad:   {trimmed!r}")
+
+    print(f"\naudio seconds sent to the model: {total_in:.2f} -> {total_out:.2f} ({1 - total_out / total_in:.1%} less)")
+
+
+if __name__ == "__main__":
+    main()
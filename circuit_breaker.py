@@ -0,0 +1,160 @@
+# circuit_breaker.py
+
+import logging
+import os
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from rate_limiter import Clock
+from retry_policy import DeadlineExceeded
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OPENAI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("OPENAI_BREAKER_FAILURE_THRESHOLD", "5"))
+OPENAI_BREAKER_RESET_TIMEOUT = float(os.getenv("OPENAI_BREAKER_RESET_TIMEOUT", "30"))
+OPENAI_BREAKER_HALF_OPEN_CALLS = int(os.getenv("OPENAI_BREAKER_HALF_OPEN_CALLS", "1"))
+# e.g. "gpt-4=gpt-3.5-turbo,gpt-4o=gpt-4o-mini"; models without an entry fail fast
+OPENAI_FALLBACK_MODELS = os.getenv("OPENAI_FALLBACK_MODELS", "gpt-4=gpt-3.5-turbo")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"circuit for {model} is open")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def counts_as_failure(exc: BaseException) -> bool:
+    """Upstream trouble trips the breaker; our own bad requests (4xx) don't."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(exc, (httpx.TransportError, DeadlineExceeded))
+
+
+class CircuitBreaker:
+    """
+    Closed: calls flow, consecutive failures are counted.
+    Open: calls fail immediately until `reset_timeout` has passed.
+    Half-open: a few probe calls are let through; one success closes the
+    circuit, one failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = OPENAI_BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = OPENAI_BREAKER_RESET_TIMEOUT,
+                 half_open_calls: int = OPENAI_BREAKER_HALF_OPEN_CALLS,
+                 clock: Optional[Clock] = None,
+                 on_transition: Optional[Callable[[str, str, str], None]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.clock = clock or Clock()
+        self.on_transition = on_transition
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        if self.state == OPEN:
+            waited = self.clock.now() - self.opened_at
+            if waited < self.reset_timeout:
+                raise CircuitOpenError(self.name, self.reset_timeout - waited)
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_calls:
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self.probes += 1
+
+    def record_success(self):
+        self.failures = 0
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock.now()
+            if self.state != OPEN:
+                self._transition(OPEN)
+
+    def release(self):
+        """Give back a half-open probe slot whose call never finished (cancelled)."""
+        if self.state == HALF_OPEN and self.probes > 0:
+            self.probes -= 1
+
+    def record(self, exc: Optional[BaseException]):
+        if exc is None:
+            self.record_success()
+        elif counts_as_failure(exc):
+            self.record_failure()
+        elif self.state == HALF_OPEN:
+            # The probe got an answer, just not a useful one; upstream is up
+            self.record_success()
+
+    def _transition(self, state: str):
+        previous, self.state = self.state, state
+        self.probes = 0
+        if state == CLOSED:
+            self.failures = 0
+        logger.warning("Circuit for %s: %s -> %s", self.name, previous, state)
+        if self.on_transition is not None:
+            self.on_transition(self.name, previous, state)
+
+
+def _parse_fallbacks(spec: str) -> Dict[str, str]:
+    fallbacks = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, fallback = item.partition("=")
+        if fallback.strip():
+            fallbacks[model.strip()] = fallback.strip()
+    return fallbacks
+
+
+class CircuitBreakers:
+    """One breaker per model, plus the configured fallback chain."""
+
+    def __init__(self, fallbacks: Optional[Dict[str, str]] = None, clock: Optional[Clock] = None, **breaker_options):
+        self.fallbacks = fallbacks if fallbacks is not None else _parse_fallbacks(OPENAI_FALLBACK_MODELS)
+        self.clock = clock
+        self.breaker_options = breaker_options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.transitions: Counter = Counter()  # (model, from, to) -> count
+        self.listeners: List[Callable[[str, str, str], None]] = []
+
+    def get(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = self._breakers[model] = CircuitBreaker(
+                model, clock=self.clock, on_transition=self._on_transition, **self.breaker_options
+            )
+        return breaker
+
+    def chain(self, model: str) -> List[str]:
+        """`model` followed by its fallbacks, without cycles."""
+        chain = [model]
+        while self.fallbacks.get(chain[-1]) and self.fallbacks[chain[-1]] not in chain:
+            chain.append(self.fallbacks[chain[-1]])
+        return chain
+
+    def states(self) -> Dict[str, str]:
+        return {model: breaker.state for model, breaker in self._breakers.items()}
+
+    def _on_transition(self, model: str, previous: str, state: str):
+        self.transitions[(model, previous, state)] += 1
+        for listener in self.listeners:
+            listener(model, previous, state)
+
+
+circuit_breakers = CircuitBreakers()
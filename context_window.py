@@ -0,0 +1,148 @@
+# context_window.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional
+
+from dotenv import load_dotenv
+
+from models import ChatMessage
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_MAX_SUMMARIES = int(os.getenv("CONTEXT_MAX_SUMMARIES", "10000"))
+# Every chat message costs a few tokens of framing on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed, or no cached BPE file on an offline box
+    _encoding = None
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=65536)
+def count_tokens(text: str) -> int:
+    """
+    Token count for `text`, memoized because the same history messages are
+    re-counted on every turn. Uses tiktoken when available, otherwise a
+    local approximation (~1 token per 4 characters of each word).
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return sum((len(piece) + 3) // 4 for piece in _WORD_RE.findall(text))
+
+
+def message_tokens(message: ChatMessage) -> int:
+    return count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _digest(messages: List[ChatMessage]) -> str:
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(message.role.encode())
+        digest.update(b"\0")
+        digest.update(message.content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _Summary:
+    def __init__(self):
+        self.text = ""
+        self.covered = 0  # number of non-system messages folded into `text`
+        self.digest = _digest([])  # fingerprint of those messages
+        self.task: Optional[asyncio.Task] = None
+
+
+class ContextWindow:
+    """
+    Keeps the upstream prompt within a token budget.
+    Leading system messages and the most recent turns are forwarded as-is;
+    older turns are replaced by a rolling summary. Summaries are produced by
+    a background task so they never add latency to the request that
+    triggered them -- until one is ready, older turns are simply dropped.
+    """
+
+    def __init__(self, summarize: Callable[[str, List[ChatMessage]], Awaitable[str]],
+                 budget: int = CONTEXT_TOKEN_BUDGET, max_summaries: int = CONTEXT_MAX_SUMMARIES):
+        self.summarize = summarize
+        self.budget = budget
+        self.max_summaries = max_summaries
+        self._summaries: "OrderedDict[str, _Summary]" = OrderedDict()
+
+    def fit(self, messages: List[ChatMessage], key: Optional[str] = None) -> List[ChatMessage]:
+        split = 0
+        while split < len(messages) and messages[split].role == "system":
+            split += 1
+        system, turns = messages[:split], messages[split:]
+
+        used = sum(message_tokens(m) for m in system)
+        if used + sum(message_tokens(m) for m in turns) <= self.budget:
+            return list(messages)
+
+        # Stateless callers resend the whole history; its opening turns identify it
+        key = key or _digest(turns[:2])
+        summary = self._summaries.get(key)
+        if summary is not None and _digest(turns[:summary.covered]) != summary.digest:
+            summary = None  # different conversation under the same key
+        if summary is not None:
+            self._summaries.move_to_end(key)
+            if summary.text:
+                used += count_tokens(summary.text) + MESSAGE_OVERHEAD_TOKENS
+
+        # Walk back from the newest turn; always keep at least the last message
+        start = len(turns)
+        while start > 0:
+            cost = message_tokens(turns[start - 1])
+            if start < len(turns) and used + cost > self.budget:
+                break
+            used += cost
+            start -= 1
+
+        if summary is None:
+            summary = self._new_summary(key)
+        if summary.covered < start:
+            self._schedule(key, summary, turns[:start], turns[summary.covered:start])
+
+        fitted = list(system)
+        if summary.text and summary.covered <= start:
+            fitted.append(ChatMessage(
+                role="system",
+                content=f"Summary of the earlier conversation: {summary.text}"
+            ))
+        fitted.extend(turns[start:])
+        return fitted
+
+    def _new_summary(self, key: str) -> _Summary:
+        summary = self._summaries[key] = _Summary()
+        while len(self._summaries) > self.max_summaries:
+            self._summaries.popitem(last=False)
+        return summary
+
+    def _schedule(self, key: str, summary: _Summary, covered: List[ChatMessage],
+                  pending: List[ChatMessage]):
+        if summary.task is not None and not summary.task.done():
+            return
+        summary.task = asyncio.get_running_loop().create_task(
+            self._refresh(key, summary, covered, pending)
+        )
+
+    async def _refresh(self, key: str, summary: _Summary, covered: List[ChatMessage],
+                       pending: List[ChatMessage]):
+        try:
+            summary.text = await self.summarize(summary.text, pending)
+            summary.covered = len(covered)
+            summary.digest = _digest(covered)
+        except Exception:
+            logger.exception("Failed to summarize conversation %s", key)
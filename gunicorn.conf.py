@@ -0,0 +1,36 @@
+# gunicorn.conf.py
+#
+# Several workers with aggregated /metrics:
+#     PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus gunicorn -c gunicorn.conf.py main:app
+# uvicorn --workers has no hook for a worker's exit, so use gunicorn whenever
+# PROMETHEUS_MULTIPROC_DIR is set.
+
+import glob
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Only the multiprocess helpers: importing metrics here would give the master metric files of its own
+from prometheus_client import multiprocess  # noqa: E402
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    # Samples left by a previous run would otherwise be added to this one's
+    if PROMETHEUS_MULTIPROC_DIR:
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+        for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's livesum gauges (in-flight requests, queue depths) from the totals
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(worker.pid)
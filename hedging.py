@@ -0,0 +1,115 @@
+# hedging.py
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from retry_policy import RetryBudget
+
+load_dotenv()
+
+OPENAI_HEDGE_ENABLED = os.getenv("OPENAI_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+OPENAI_HEDGE_QUANTILE = float(os.getenv("OPENAI_HEDGE_QUANTILE", "0.95"))
+OPENAI_HEDGE_MIN_DELAY = float(os.getenv("OPENAI_HEDGE_MIN_DELAY", "0.5"))
+OPENAI_HEDGE_MIN_SAMPLES = int(os.getenv("OPENAI_HEDGE_MIN_SAMPLES", "20"))
+# Hedges may add at most this fraction of extra upstream requests
+OPENAI_HEDGE_MAX_EXTRA = float(os.getenv("OPENAI_HEDGE_MAX_EXTRA", "0.05"))
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies with a cached quantile."""
+
+    def __init__(self, window: int = 500, refresh_every: int = 10):
+        self.samples = deque(maxlen=window)
+        self.refresh_every = refresh_every
+        self._since_refresh = 0
+        self._cache: Dict[float, float] = {}
+
+    def __len__(self):
+        return len(self.samples)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self._since_refresh += 1
+        if self._since_refresh >= self.refresh_every:
+            self._cache.clear()
+            self._since_refresh = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        if q not in self._cache:
+            ordered = sorted(self.samples)
+            self._cache[q] = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return self._cache[q]
+
+
+class Hedger:
+    """
+    Sends a second, identical request when the first hasn't answered within
+    the observed latency quantile; the first to succeed wins and the other
+    is cancelled. A budget caps hedges at a fraction of all requests.
+    """
+
+    def __init__(self, quantile: float = OPENAI_HEDGE_QUANTILE, min_delay: float = OPENAI_HEDGE_MIN_DELAY,
+                 min_samples: int = OPENAI_HEDGE_MIN_SAMPLES, max_extra: float = OPENAI_HEDGE_MAX_EXTRA):
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.budget = RetryBudget(ratio=max_extra, min_per_second=0)
+        self._trackers: Dict[str, LatencyTracker] = {}
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def tracker(self, key: str) -> LatencyTracker:
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            tracker = self._trackers[key] = LatencyTracker()
+        return tracker
+
+    def delay(self, key: str) -> Optional[float]:
+        """How long to wait before hedging, or None while there is too little data."""
+        tracker = self.tracker(key)
+        if len(tracker) < self.min_samples:
+            return None
+        return max(self.min_delay, tracker.quantile(self.quantile))
+
+    async def run(self, key: str, fn: Callable[[], Awaitable], hedge_fn: Optional[Callable[[], Awaitable]] = None):
+        """Await `fn()`, racing it against `hedge_fn()` (default: `fn` again) if it runs long."""
+        self.budget.deposit()
+        tracker = self.tracker(key)
+        delay = self.delay(key)
+        started = time.monotonic()
+        first = asyncio.ensure_future(fn())
+        tasks = {first: started}
+        try:
+            if delay is not None:
+                await asyncio.wait({first}, timeout=delay)
+            if not first.done() and delay is not None and self.budget.try_withdraw():
+                self.hedged += 1
+                tasks[asyncio.ensure_future((hedge_fn or fn)())] = time.monotonic()
+
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [t for t in done if t.exception() is None]
+                if succeeded:
+                    winner = succeeded[0]
+                    tracker.record(time.monotonic() - tasks[winner])
+                    if winner is not first:
+                        self.hedge_wins += 1
+                    return winner.result()
+                if not pending:
+                    # Both attempts failed; surface the first request's error
+                    return first.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+hedger = Hedger()
@@ -0,0 +1,143 @@
+# llm_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_DB_PATH = os.getenv("LLM_CACHE_DB_PATH")  # unset = memory only
+
+
+def cache_key(payload: dict) -> str:
+    """Canonical hash of the fields that determine a completion."""
+    canonical = {
+        "model": payload.get("model"),
+        "messages": payload.get("messages"),
+        "max_tokens": payload.get("max_tokens"),
+        "temperature": payload.get("temperature"),
+    }
+    blob = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class SQLiteCacheTier:
+    """On-disk second tier; survives restarts and is shared by workers on one host."""
+
+    def __init__(self, path: str, table: str = "llm_cache"):
+        self.table = table
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, seconds until it expires), or None."""
+        row = self.conn.execute(
+            f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            with self.conn:
+                self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            return None
+        return json.loads(value), remaining
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+class ResponseCache:
+    """
+    In-process LRU with a per-entry TTL, optionally backed by a disk tier.
+    Values must be JSON-serializable when a disk tier is configured.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl: float = LLM_CACHE_TTL,
+                 disk: Optional[SQLiteCacheTier] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk = disk
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        if self.disk is not None:
+            found = self.disk.get(key)
+            if found is not None:
+                value, remaining = found
+                # Keeps the disk entry's expiry, so promoting it doesn't extend its life
+                self._remember(key, value, remaining)
+                self.disk_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any):
+        self._remember(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value, self.ttl)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+    def _remember(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+response_cache = ResponseCache(
+    disk=SQLiteCacheTier(LLM_CACHE_DB_PATH) if LLM_CACHE_DB_PATH else None
+)
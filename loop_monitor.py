@@ -0,0 +1,59 @@
+# loop_monitor.py
+
+import asyncio
+import time
+from typing import Optional
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: how late a periodic `sleep(interval)` wakes up.
+    Sustained lag means something is blocking the loop (CPU-bound work,
+    sync I/O) and every in-flight request is paying for it.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+        self.total = 0.0
+        self.samples = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """Lag in milliseconds; `reset` starts a new max/mean window."""
+        snapshot = {
+            "last_ms": self.last * 1000,
+            "max_ms": self.max * 1000,
+            "mean_ms": self.total / self.samples * 1000 if self.samples else 0.0,
+        }
+        if reset:
+            self.max = self.total = 0.0
+            self.samples = 0
+        return snapshot
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.last = lag
+            self.max = max(self.max, lag)
+            self.total += lag
+            self.samples += 1
+
+
+loop_monitor = LoopLagMonitor()
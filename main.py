@@ -1,19 +1,65 @@
 import os
-from fastapi import FastAPI, HTTPException
+import json
+import asyncio
+import logging
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Header, Depends, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+import httpx
 from dotenv import load_dotenv
 from orchestrator_agent import orchestrate_trip
 
-from models import VoiceInputRequest, TripRequest, TripPlanResponse, ChatRequest, ChatResponse
-from openai_client import transcribe_audio, get_trip_plan, chat_completion
+from models import (
+    VoiceInputRequest, TripRequest, TripPlanResponse, ChatRequest, ChatResponse, ChatMessage,
+    SessionCreateRequest, SessionCreateResponse, SessionChatRequest
+)
+from session_store import session_store
+from llm_cache import response_cache
+from transcript_cache import transcript_cache
+from retry_policy import DeadlineExceeded
+from circuit_breaker import CircuitOpenError, circuit_breakers
+from rate_limiter import RateLimitExceeded
+from loop_monitor import loop_monitor
+from metrics import CONTENT_TYPE_LATEST, PrometheusMiddleware, record_transition, render
+from tracing import TracingMiddleware, span
+from transcriber import AudioDecodeError, AudioSource, SAMPLE_RATE, TranscriberBusy, TranscriberUnavailable, transcriber
+from streaming_asr import MAX_SAMPLE_RATE, MIN_SAMPLE_RATE, InvalidFrame, StreamTooLong, StreamingTranscription
+from openai_client import transcribe_audio, get_trip_plan, chat_completion, chat_completion_stream, init_client, close_client
 
 load_dotenv()  # Load your .env file
 
+logger = logging.getLogger(__name__)
+
+# Raw voice uploads: larger bodies are rejected, and ones past the spool size go to a temp file
+VOICE_UPLOAD_MAX_BYTES = int(os.getenv("VOICE_UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+VOICE_UPLOAD_SPOOL_BYTES = int(os.getenv("VOICE_UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled upstream client per worker, reused by every OpenAI call
+    await init_client()
+    loop_monitor.start()
+    # Whisper loads once per worker (or warms its process pool); without it voice input answers 503
+    try:
+        await asyncio.to_thread(transcriber.load)
+    except Exception:
+        logger.exception("Whisper model %s could not be loaded; voice transcription is disabled", transcriber.model_name)
+    yield
+    await loop_monitor.stop()
+    await close_client()
+    session_store.close()
+    response_cache.close()
+    transcript_cache.close()
+    transcriber.close()
+
 app = FastAPI(
     title="AI Chatbot Interface",
-    description="A chatbot interface similar to ChatGPT or Perplexity"
+    description="A chatbot interface similar to ChatGPT or Perplexity",
+    lifespan=lifespan
 )
 
 # For easy local dev
@@ -25,44 +71,310 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request duration and in-flight metrics for every route, exposed on /metrics
+app.add_middleware(PrometheusMiddleware)
+# Root span per request; with TRACE_FILE set spans are exported there, summarise with `python tracing.py`
+app.add_middleware(TracingMiddleware)
+circuit_breakers.listeners.append(record_transition)
+
 # Create a static directory if it doesn't exist
 os.makedirs("static", exist_ok=True)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Upstream failures that survived retries are reported as gateway errors, not 500s
+@app.exception_handler(httpx.HTTPStatusError)
+async def upstream_status_error(request, exc: httpx.HTTPStatusError):
+    if exc.response.status_code == 429:
+        headers = {"Retry-After": exc.response.headers.get("retry-after", "1")}
+        return JSONResponse(status_code=503, content={"detail": "Upstream rate limited."}, headers=headers)
+    return JSONResponse(status_code=502, content={"detail": f"Upstream error {exc.response.status_code}."})
+
+@app.exception_handler(httpx.TransportError)
+async def upstream_transport_error(request, exc: httpx.TransportError):
+    return JSONResponse(status_code=502, content={"detail": "Upstream unreachable."})
+
+@app.exception_handler(DeadlineExceeded)
+async def upstream_deadline_exceeded(request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+@app.exception_handler(CircuitOpenError)
+async def upstream_circuit_open(request, exc: CircuitOpenError):
+    headers = {"Retry-After": str(max(1, round(exc.retry_after)))}
+    return JSONResponse(status_code=503, content={"detail": "Upstream model unavailable."}, headers=headers)
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded(request, exc: RateLimitExceeded):
+    headers = {"Retry-After": str(max(1, round(exc.retry_after)))}
+    return JSONResponse(status_code=503, content={"detail": "Too many requests queued for the model."}, headers=headers)
+
+@app.exception_handler(AudioDecodeError)
+async def audio_decode_error(request, exc: AudioDecodeError):
+    return JSONResponse(status_code=400, content={"detail": f"Could not decode audio: {exc}"})
+
+@app.exception_handler(TranscriberUnavailable)
+async def transcriber_unavailable(request, exc: TranscriberUnavailable):
+    return JSONResponse(status_code=503, content={"detail": "Voice transcription is unavailable."})
+
+@app.exception_handler(TranscriberBusy)
+async def transcriber_busy(request, exc: TranscriberBusy):
+    headers = {"Retry-After": str(round(exc.retry_after))}
+    return JSONResponse(status_code=503, content={"detail": "Voice transcription is busy."}, headers=headers)
+
+def cache_enabled(
+    cache_control: Optional[str] = Header(None),
+    x_cache_bypass: Optional[str] = Header(None)
+) -> bool:
+    """Per-request opt-out of the LLM response cache."""
+    if x_cache_bypass and x_cache_bypass.lower() in ("1", "true", "yes"):
+        return False
+    if cache_control and ("no-cache" in cache_control or "no-store" in cache_control):
+        return False
+    return True
+
 @app.get("/")
 async def root():
     return FileResponse("static/index.html")
 
 @app.get("/health")
-def health():
-    return {"status": "ok"}
+def health(reset_lag: bool = False):
+    return {"status": "ok", "event_loop_lag": loop_monitor.snapshot(reset=reset_lag)}
+
+# Plain def: in multiprocess mode rendering reads every worker's files, so keep it off the event loop
+@app.get("/metrics")
+def metrics():
+    return Response(render(), media_type=CONTENT_TYPE_LATEST)
 
 @app.post("/api/voice/process")
+@span("handler.voice")
 async def process_voice(input: VoiceInputRequest):
     if not input.audio_base64 and not input.text:
         raise HTTPException(status_code=400, detail="No audio or text supplied.")
     if input.text:
         text = input.text
     else:
-        # Call Whisper model or placeholder
+        # Local Whisper inference, off the event loop
         text = await transcribe_audio(input.audio_base64)
     return {"transcript": text}
 
+async def _spool_body(request: Request) -> AudioSource:
+    """
+    Read a raw request body chunk by chunk. Small uploads stay in one
+    bytearray; larger ones spill to an unnamed temp file, which ffmpeg
+    then reads as its stdin without the audio passing through Python again.
+    """
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > VOICE_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Audio upload is too large.")
+    buffer, spill, size = bytearray(), None, 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > VOICE_UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Audio upload is too large.")
+            if spill is None and size > VOICE_UPLOAD_SPOOL_BYTES:
+                spill = tempfile.TemporaryFile()
+                spill.write(buffer)
+                buffer = None
+            if spill is not None:
+                spill.write(chunk)
+            else:
+                buffer += chunk
+    except BaseException:
+        if spill is not None:
+            spill.close()
+        raise
+    if not size:
+        raise HTTPException(status_code=400, detail="No audio supplied.")
+    return spill if spill is not None else buffer
+
+# Raw audio body (e.g. the recorder's audio/webm Blob): no base64 inflation, no JSON parsing
+@app.post("/api/voice/upload")
+@span("handler.voice_upload")
+async def upload_voice(request: Request, language: Optional[str] = None):
+    audio = await _spool_body(request)
+    try:
+        text = await transcriber.transcribe(audio, language)
+    finally:
+        if hasattr(audio, "close"):
+            audio.close()
+    return {"transcript": text}
+
+# Live dictation: binary messages are 16-bit mono PCM at `sample_rate`, {"type": "stop"} ends
+# the utterance. Replies are {"type": "partial" | "final", "text": ...} or {"type": "error", ...}.
+def _control_type(text: str) -> Optional[str]:
+    """The "type" of a JSON control frame, or None if the frame isn't a JSON object."""
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return None
+    return message.get("type") if isinstance(message, dict) else None
+
+@app.websocket("/ws/voice")
+async def voice_stream(websocket: WebSocket, sample_rate: int = SAMPLE_RATE, language: Optional[str] = None):
+    await websocket.accept()
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        detail = f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}."
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close(code=1003)
+        return
+    if not transcriber.ready:
+        await websocket.send_json({"type": "error", "detail": "Voice transcription is unavailable."})
+        await websocket.close(code=1013)
+        return
+
+    stream = StreamingTranscription(sample_rate, language)
+    wake = asyncio.Event()
+
+    async def partials():
+        # At most one partial in flight; audio that arrives meanwhile is folded into the next one
+        while True:
+            await wake.wait()
+            wake.clear()
+            if not stream.partial_due():
+                continue
+            try:
+                text = await stream.partial()
+                await websocket.send_json({"type": "partial", "text": text})
+            except TranscriberBusy:
+                continue  # skip this partial under load; the final transcript still runs
+            except Exception:
+                # E.g. the client went away mid-send; the receive loop notices and ends the stream
+                logger.exception("Partial transcript failed; no more partials on this stream")
+                return
+
+    worker = asyncio.create_task(partials())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                stream.feed(message["bytes"])
+                wake.set()
+            elif message.get("text") and _control_type(message["text"]) == "stop":
+                break  # other or malformed control frames are ignored
+    except StreamTooLong as exc:
+        await websocket.send_json({"type": "error", "detail": str(exc)})
+        await websocket.close(code=1009)
+        return
+    except InvalidFrame as exc:
+        await websocket.send_json({"type": "error", "detail": str(exc)})
+        await websocket.close(code=1003)
+        return
+    finally:
+        worker.cancel()
+
+    try:
+        with span("ws.voice.final", seconds=round(stream.seconds, 2)):
+            text = await stream.finish()
+    except TranscriberBusy as exc:
+        await websocket.send_json({"type": "error", "detail": "Voice transcription is busy.",
+                                   "retry_after": round(exc.retry_after)})
+    else:
+        await websocket.send_json({"type": "final", "text": text})
+    await websocket.close()
+
 @app.post("/api/trip/create", response_model=TripPlanResponse)
-async def create_trip_plan(request: TripRequest):
-    plan_data = await orchestrate_trip(request.conversation)
+@span("handler.trip")
+async def create_trip_plan(request: TripRequest, use_cache: bool = Depends(cache_enabled)):
+    plan_data = await orchestrate_trip(request.conversation, use_cache=use_cache)
     return TripPlanResponse(itinerary=plan_data["itinerary"])
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+@span("handler.chat")
+async def chat(request: ChatRequest, use_cache: bool = Depends(cache_enabled)):
     """
     Handle chat conversations with the AI assistant.
     """
-    response_message = await chat_completion(request.messages)
+    response_message = await chat_completion(request.messages, use_cache=use_cache)
     return ChatResponse(message=response_message)
 
+def _sse(data: str, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {data}\n\n"
+
+def _chat_event_stream(messages, session_id=None, on_done=None):
+    """
+    Stream the assistant reply as Server-Sent Events.
+    Each `data:` event carries {"delta": "..."}; the final `done` event
+    carries the assembled message in the same shape as ChatResponse.
+    """
+    async def events():
+        parts = []
+        try:
+            async for delta in chat_completion_stream(messages, session_id):
+                parts.append(delta)
+                yield _sse(json.dumps({"delta": delta}))
+        except Exception as exc:
+            yield _sse(json.dumps({"detail": str(exc)}), event="error")
+            return
+        response = ChatResponse(message=ChatMessage(role="assistant", content="".join(parts)))
+        if on_done is not None:
+            try:
+                on_done(response.message)
+            except KeyError:
+                # The session went away while the reply streamed; hand the reply over anyway
+                yield _sse(json.dumps({"detail": SESSION_GONE, "message": response.message.model_dump()}), event="error")
+                return
+        yield _sse(response.model_dump_json(), event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/chat/stream")
+@span("handler.chat_stream")
+async def chat_stream(request: ChatRequest):
+    return _chat_event_stream(request.messages)
+
+# Session API: the server keeps the history, clients send only the new message
+SESSION_GONE = "Session was deleted or expired while the reply was generated."
+
+def _session_history(session_id: str):
+    try:
+        return session_store.get(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown or expired session.")
+
+@app.post("/api/sessions", response_model=SessionCreateResponse)
+async def create_session(request: SessionCreateRequest):
+    return SessionCreateResponse(session_id=session_store.create(request.messages))
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    session_store.delete(session_id)
+    return {"status": "ok"}
+
+@app.post("/api/sessions/{session_id}/chat", response_model=ChatResponse)
+@span("handler.session_chat")
+async def session_chat(session_id: str, request: SessionChatRequest,
+                       use_cache: bool = Depends(cache_enabled)):
+    user_message = ChatMessage(role="user", content=request.content)
+    history = _session_history(session_id)
+    response_message = await chat_completion(history + [user_message], session_id, use_cache=use_cache)
+    # Only record the turn once it succeeded, so retries don't duplicate it
+    try:
+        session_store.append(session_id, user_message, response_message)
+    except KeyError:
+        # 409, not 404: the reply is already paid for, so clients shouldn't resend the turn
+        return JSONResponse(status_code=409, content={"detail": SESSION_GONE, "message": response_message.model_dump()})
+    return ChatResponse(message=response_message)
+
+@app.post("/api/sessions/{session_id}/chat/stream")
+@span("handler.session_chat_stream")
+async def session_chat_stream(session_id: str, request: SessionChatRequest):
+    user_message = ChatMessage(role="user", content=request.content)
+    history = _session_history(session_id)
+    return _chat_event_stream(
+        history + [user_message],
+        session_id,
+        on_done=lambda reply: session_store.append(session_id, user_message, reply)
+    )
+
 # Run the server when this file is executed directly
 if __name__ == "__main__":
     import uvicorn
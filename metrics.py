@@ -0,0 +1,151 @@
+# metrics.py
+
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+# prometheus_client picks its storage backend from PROMETHEUS_MULTIPROC_DIR at import time
+load_dotenv()
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# Set this (to a writable directory) when running several workers; every worker then writes its
+# samples there and /metrics aggregates them. Run under gunicorn -c gunicorn.conf.py, which
+# empties the directory at startup and drops exited workers' live gauges
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to complete an HTTP request, including streamed bodies",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests currently being served", ["method"], multiprocess_mode="livesum",
+)
+
+OPENAI_REQUEST_DURATION = Histogram(
+    "openai_request_duration_seconds", "Latency of single upstream chat completion attempts",
+    ["model", "outcome"], buckets=_LATENCY_BUCKETS,
+)
+OPENAI_REQUESTS_IN_PROGRESS = Gauge(
+    "openai_requests_in_progress", "Upstream chat completion attempts in flight", ["model"],
+    multiprocess_mode="livesum",
+)
+OPENAI_TOKENS = Counter("openai_tokens_total", "Tokens reported by upstream usage", ["model", "kind"])
+
+# Hit ratio: rate(cache_requests_total{result="hit"}[5m]) / rate(cache_requests_total[5m])
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["cache", "result"])
+
+RATE_LIMIT_QUEUE_DEPTH = Gauge(
+    "rate_limiter_queue_depth", "Requests waiting for RPM/TPM capacity", ["model"], multiprocess_mode="livesum",
+)
+RATE_LIMIT_WAIT = Histogram(
+    "rate_limiter_wait_seconds", "Time spent queued for RPM/TPM capacity", ["model"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+TRANSCRIPTION_QUEUE_DEPTH = Gauge(
+    "transcription_queue_depth", "Voice clips being decoded, transcribed or waiting", multiprocess_mode="livesum",
+)
+TRANSCRIPTION_REJECTED = Counter("transcription_rejected_total", "Voice clips turned away with 503 (queue full)")
+TRANSCRIPTION_AUDIO_SECONDS = Counter(
+    "transcription_audio_seconds_total", "Audio seconds received vs sent to the model after VAD", ["stage"],
+)
+TRANSCRIPTION_BATCH_SIZE = Histogram(
+    "transcription_batch_size", "Clips per batched Whisper forward pass", buckets=(1, 2, 4, 8, 16, 32),
+)
+
+CIRCUIT_TRANSITIONS = Counter("circuit_breaker_transitions_total", "Circuit breaker state changes", ["model", "state"])
+
+ROUTER_DECISIONS = Counter("router_decisions_total", "Model tier picked per request", ["route", "model", "reason"])
+
+
+@contextmanager
+def track_upstream(model: str):
+    """Time one upstream attempt and count it as in flight meanwhile."""
+    in_progress = OPENAI_REQUESTS_IN_PROGRESS.labels(model)
+    in_progress.inc()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        in_progress.dec()
+        OPENAI_REQUEST_DURATION.labels(model, outcome).observe(time.perf_counter() - started)
+
+
+def record_usage(model: str, usage: dict):
+    if "prompt_tokens" in usage:
+        OPENAI_TOKENS.labels(model, "prompt").inc(usage["prompt_tokens"])
+    if "completion_tokens" in usage:
+        OPENAI_TOKENS.labels(model, "completion").inc(usage["completion_tokens"])
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_transition(model: str, previous: str, state: str):
+    CIRCUIT_TRANSITIONS.labels(model, state).inc()
+
+
+def record_routing(route: str, model: str, reason: str):
+    ROUTER_DECISIONS.labels(route, model, reason).inc()
+
+
+def render() -> bytes:
+    """Exposition text for /metrics, aggregated across workers in multiprocess mode."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+class PrometheusMiddleware:
+    """
+    Plain ASGI middleware (no per-request task or body buffering, so
+    streaming responses pass straight through). Routes are labelled by
+    their template, e.g. /api/sessions/{session_id}/chat, to keep
+    label cardinality bounded.
+    """
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(method, template, status).observe(time.perf_counter() - started)
+
@@ -0,0 +1,215 @@
+"""
+Local stand-in for OpenAI's /v1/chat/completions, for offline load tests and CI.
+
+Replays recorded fixtures (JSONL lines of {"prompt": "<last user message>",
+"content": "<reply>"}) or generates synthetic replies, with configurable
+latency, token rate and error injection. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:8001/v1.
+
+    python mock_openai_server.py --port 8001 --latency lognormal:-1.5,0.6 \\
+        --tokens-per-second 60 --error-rate 0.02
+
+With several workers, configure through MOCK_* environment variables instead:
+
+    MOCK_LATENCY=exp:0.3 uvicorn --factory mock_openai_server:create_app --port 8001 --workers 4
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_WORDS = (
+    "berlin museum island day walk tour cafe river spree brandenburg gate evening dinner "
+    "budget hotel check train ticket morning market park gallery street food night "
+    "itinerary visit relax explore option euro per person recommend book local"
+).split()
+
+
+class LatencyDistribution:
+    """Parses 'fixed:S', 'uniform:A,B', 'exp:MEAN' or 'lognormal:MU,SIGMA' (seconds)."""
+
+    def __init__(self, spec: str):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+        if kind not in ("fixed", "uniform", "exp", "lognormal"):
+            raise ValueError(f"unknown latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return rng.uniform(self.args[0], self.args[1])
+        if self.kind == "exp":
+            return rng.expovariate(1.0 / self.args[0])
+        return rng.lognormvariate(self.args[0], self.args[1])
+
+
+class MockConfig:
+    def __init__(self, latency: str = "fixed:0.2", tokens_per_second: float = 50.0,
+                 reply_tokens: str = "uniform:20,200", error_rate: float = 0.0,
+                 error_statuses: str = "429,500,503", hang_rate: float = 0.0,
+                 hang_seconds: float = 120.0, fixtures: str = None, seed: int = None):
+        self.latency = LatencyDistribution(latency)
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = LatencyDistribution(reply_tokens)
+        self.error_rate = error_rate
+        self.error_statuses = [int(s) for s in error_statuses.split(",") if s]
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.fixtures = _load_fixtures(fixtures) if fixtures else {}
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        return cls(
+            latency=os.getenv("MOCK_LATENCY", "fixed:0.2"),
+            tokens_per_second=float(os.getenv("MOCK_TOKENS_PER_SECOND", "50")),
+            reply_tokens=os.getenv("MOCK_REPLY_TOKENS", "uniform:20,200"),
+            error_rate=float(os.getenv("MOCK_ERROR_RATE", "0")),
+            error_statuses=os.getenv("MOCK_ERROR_STATUSES", "429,500,503"),
+            hang_rate=float(os.getenv("MOCK_HANG_RATE", "0")),
+            hang_seconds=float(os.getenv("MOCK_HANG_SECONDS", "120")),
+            fixtures=os.getenv("MOCK_FIXTURES"),
+            seed=int(os.environ["MOCK_SEED"]) if os.getenv("MOCK_SEED") else None,
+        )
+
+
+def _load_fixtures(path: str) -> dict:
+    fixtures = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                fixtures[record["prompt"]] = record["content"]
+    return fixtures
+
+
+def _reply_for(config: MockConfig, payload: dict) -> str:
+    messages = payload.get("messages") or []
+    prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    if prompt in config.fixtures:
+        return config.fixtures[prompt]
+    # Synthetic reply: deterministic per prompt, length from the configured distribution
+    seed = int(hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).hexdigest()[:16], 16)
+    rng = random.Random(seed)
+    length = max(1, min(int(config.reply_tokens.sample(rng)), payload.get("max_tokens") or 4096))
+    return " ".join(rng.choice(_WORDS) for _ in range(length)).capitalize() + "."
+
+
+def _usage(payload: dict, content: str) -> dict:
+    prompt_tokens = sum(len(m.get("content", "").split()) for m in payload.get("messages") or [])
+    completion_tokens = len(content.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def create_app(config: MockConfig = None) -> FastAPI:
+    config = config or MockConfig.from_env()
+    app = FastAPI(title="Mock OpenAI")
+    app.state.config = config
+    app.state.requests = 0
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "requests": app.state.requests}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        app.state.requests += 1
+        rng = config.rng
+
+        if rng.random() < config.hang_rate:
+            await asyncio.sleep(config.hang_seconds)
+        if config.error_statuses and rng.random() < config.error_rate:
+            status = rng.choice(config.error_statuses)
+            headers = {"retry-after": "1"} if status == 429 else {}
+            return JSONResponse(
+                status_code=status,
+                content={"error": {"message": "injected fault", "type": "mock_error", "code": status}},
+                headers=headers,
+            )
+
+        content = _reply_for(config, payload)
+        model = payload.get("model", "gpt-4")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        time_to_first_token = config.latency.sample(rng)
+        words = content.split(" ")
+        per_token = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+        if payload.get("stream"):
+            async def events():
+                await asyncio.sleep(time_to_first_token)
+                for i, word in enumerate(words):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    if per_token:
+                        await asyncio.sleep(per_token)
+                final = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(time_to_first_token + per_token * len(words))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": _usage(payload, content),
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="fixed:0.2", help="time to first token distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--reply-tokens", default="uniform:20,200", help="reply length distribution (tokens)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default="429,500,503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of requests that stall")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--fixtures", help="JSONL of recorded {prompt, content} pairs")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    import uvicorn
+    config = MockConfig(
+        latency=args.latency, tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate, error_statuses=args.error_statuses, hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds, fixtures=args.fixtures, seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
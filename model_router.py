@@ -0,0 +1,127 @@
+# model_router.py
+
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict
+
+import numpy as np
+from dotenv import load_dotenv
+
+from metrics import record_routing
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+ROUTER_SMALL_MODEL = os.getenv("ROUTER_SMALL_MODEL", "gpt-3.5-turbo")
+ROUTER_LARGE_MODEL = os.getenv("ROUTER_LARGE_MODEL", "gpt-4")
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", "0.5"))
+
+SMALL = "small"
+LARGE = "large"
+
+_SMALLTALK_RE = re.compile(
+    r"^\s*(hi|hii+|hey|hello|hallo|yo|thanks?( you)?( so much| a lot)?|thx|ty|ok(ay)?|cool|great|"
+    r"nice|perfect|awesome|bye|good ?bye|see you|got it|sounds good|yes|no|sure)\W*\s*$",
+    re.IGNORECASE,
+)
+_TRAVEL_RE = re.compile(
+    r"\b(itinerar\w*|trip|travel\w*|flight\w*|fly|hotel\w*|hostel\w*|book\w*|budget|cost\w*|price\w*|"
+    r"days?|nights?|weeks?|visit\w*|museum\w*|restaurant\w*|plan\w*|route|train\w*|airport|"
+    r"check[- ]?in|check[- ]?out|adults?|kids?|children|tickets?|tour\w*)\b",
+    re.IGNORECASE,
+)
+_DATE_RE = re.compile(
+    r"\b(\d{1,2}[./-]\d{1,2}([./-]\d{2,4})?|\d{4}-\d{2}-\d{2}|jan\w*|feb\w*|mar\w*|apr\w*|may|jun\w*|"
+    r"jul\w*|aug\w*|sep\w*|oct\w*|nov\w*|dec\w*|monday|tuesday|wednesday|thursday|friday|"
+    r"saturday|sunday|tomorrow|weekend)\b",
+    re.IGNORECASE,
+)
+
+FEATURES = (
+    "bias", "log_chars", "words", "questions", "digits", "travel_terms",
+    "dates", "sentences", "smalltalk", "log_turns",
+)
+# Hand-fitted logistic regression over FEATURES: P(request needs the large tier)
+WEIGHTS = np.array([-3.0, 0.45, 0.03, 0.4, 0.6, 1.1, 0.8, 0.35, -4.0, 0.2], dtype=np.float32)
+
+
+def extract_features(text: str, turns: int = 1) -> np.ndarray:
+    words = text.split()
+    return np.array([
+        1.0,
+        math.log1p(len(text)),
+        min(len(words), 100),
+        text.count("?"),
+        1.0 if re.search(r"\d", text) else 0.0,
+        len(_TRAVEL_RE.findall(text)),
+        len(_DATE_RE.findall(text)),
+        max(1, len(re.findall(r"[.!?]+(\s|$)", text))),
+        1.0 if _SMALLTALK_RE.match(text) else 0.0,
+        math.log1p(turns),
+    ], dtype=np.float32)
+
+
+class RoutingDecision:
+    def __init__(self, route: str, tier: str, model: str, p_large: float, reason: str):
+        self.route = route
+        self.tier = tier
+        self.model = model
+        self.p_large = p_large
+        self.reason = reason
+
+    def as_dict(self) -> dict:
+        return {
+            "route": self.route, "tier": self.tier, "model": self.model,
+            "p_large": round(self.p_large, 3), "reason": self.reason,
+        }
+
+
+class ModelRouter:
+    """
+    Picks a model tier per request without an extra LLM call.
+    Trip planning (itinerary extraction) always goes to the large tier;
+    chat messages are scored by a tiny logistic model over cheap text
+    features, with obvious small talk short-circuited to the small tier.
+    """
+
+    def __init__(self, small_model: str = ROUTER_SMALL_MODEL, large_model: str = ROUTER_LARGE_MODEL,
+                 threshold: float = ROUTER_THRESHOLD, weights: np.ndarray = WEIGHTS,
+                 enabled: bool = ROUTER_ENABLED):
+        self.models = {SMALL: small_model, LARGE: large_model}
+        self.threshold = threshold
+        self.weights = weights
+        self.enabled = enabled
+        self.decisions: Counter = Counter()  # (route, model) -> count
+
+    def score(self, text: str, turns: int = 1) -> float:
+        z = float(self.weights @ extract_features(text, turns))
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def route(self, route: str, text: str, turns: int = 1) -> RoutingDecision:
+        if not self.enabled:
+            decision = RoutingDecision(route, LARGE, self.models[LARGE], 1.0, "disabled")
+        elif route == "trip":
+            decision = RoutingDecision(route, LARGE, self.models[LARGE], 1.0, "itinerary")
+        elif _SMALLTALK_RE.match(text):
+            decision = RoutingDecision(route, SMALL, self.models[SMALL], 0.0, "smalltalk")
+        else:
+            p_large = self.score(text, turns)
+            tier = LARGE if p_large >= self.threshold else SMALL
+            decision = RoutingDecision(route, tier, self.models[tier], p_large, "classifier")
+        self.decisions[(route, decision.model)] += 1
+        record_routing(route, decision.model, decision.reason)
+        # Per-request detail; the counts are exported as router_decisions_total
+        logger.debug("routing %s", json.dumps({**decision.as_dict(), "chars": len(text), "turns": turns}))
+        return decision
+
+    def stats(self) -> Dict[str, int]:
+        return {f"{route}:{model}": count for (route, model), count in self.decisions.items()}
+
+
+model_router = ModelRouter()
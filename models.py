@@ -24,3 +24,13 @@ class ChatRequest(BaseModel):
 
 class ChatResponse(BaseModel):
     message: ChatMessage
+
+# Server-side chat sessions
+class SessionCreateRequest(BaseModel):
+    messages: List[ChatMessage] = []
+
+class SessionCreateResponse(BaseModel):
+    session_id: str
+
+class SessionChatRequest(BaseModel):
+    content: str
@@ -1,62 +1,357 @@
 import os
+import json
+import asyncio
+import base64
+import binascii
 from dotenv import load_dotenv
-from typing import List
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
 from models import ChatMessage
+from context_window import ContextWindow, MESSAGE_OVERHEAD_TOKENS, count_tokens
+from rate_limiter import rate_limiter
+from retry_policy import DeadlineExceeded, retry_policy
+from circuit_breaker import CircuitOpenError, circuit_breakers
+from hedging import OPENAI_HEDGE_ENABLED, hedger
+from model_router import model_router
+from llm_cache import LLM_CACHE_ENABLED, cache_key, response_cache
+from metrics import record_cache, record_usage, track_upstream
+from tracing import span
+from transcriber import AudioDecodeError, transcriber
 
 # Load environment variables from .env file
 load_dotenv()
 import httpx
+import logging
   # Load environment variables from .env file
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-# Debugging line to check if the key is loaded
-# Function to interact with OpenAI Whisper API (example - mock, use actual API as needed)
-async def transcribe_audio(audio_base64: str):
-    # In real use: post to OpenAI's /audio/transcriptions endpoint.
-    # Placeholder: Return mock transcription.
-    return "transcribed text from audio"
+# Point at a local stand-in (e.g. mock_openai_server.py) for offline runs
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+OPENAI_CHAT_URL = f"{OPENAI_BASE_URL}/chat/completions"
+
+# Connection pool settings for the shared upstream client
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "false").lower() in ("1", "true", "yes")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+logger = logging.getLogger(__name__)
+
+# Cheaper model used to fold old chat turns into a rolling summary
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-3.5-turbo")
+
+# One pooled client per worker process, opened and closed by the app lifespan
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (installed via `pip install httpx[http2]`)
+    except ImportError:
+        return False
+    return True
+
+
+async def init_client() -> httpx.AsyncClient:
+    """Create the shared upstream client (idempotent)."""
+    global _client
+    if _client is None:
+        limits = httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        )
+        _client = httpx.AsyncClient(
+            limits=limits,
+            timeout=OPENAI_TIMEOUT,
+            http2=OPENAI_HTTP2 and _http2_available(),
+            headers={
+                "Authorization": f"Bearer {OPENAI_API_KEY}",
+                "Content-Type": "application/json"
+            },
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def get_client() -> httpx.AsyncClient:
+    # Fall back to lazy creation when used outside the FastAPI lifespan (scripts, tests)
+    if _client is None:
+        return await init_client()
+    return _client
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key onto one shared task.
+    Each caller awaits the task through `asyncio.shield`, so a caller that
+    disconnects only stops waiting; the upstream call is cancelled once the
+    last waiter has gone.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, call=call: self._forget(key, call))
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._forget(key, call)
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+_singleflight = SingleFlight()
+
+
+def _estimate_tokens(payload: dict) -> int:
+    # Prompt tokens plus the completion allowance, as counted against TPM limits
+    prompt = sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in payload["messages"])
+    return prompt + payload.get("max_tokens", 0)
+
+
+async def _guarded(model: str, attempt: Callable[[], Awaitable], tokens: int):
+    """Run one upstream attempt through the model's circuit breaker, once RPM/TPM capacity is free."""
+    breaker = circuit_breakers.get(model)
+    breaker.before_call()
+    try:
+        # Queue for capacity instead of letting a burst come back as 429s
+        with span("openai.rate_limit", model=model):
+            await rate_limiter.acquire(model, tokens)
+    except BaseException:
+        # Nothing was sent, so nothing was learned about upstream
+        breaker.release()
+        raise
+    try:
+        result = await attempt()
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as exc:
+        breaker.record(exc)
+        raise
+    breaker.record(None)
+    return result
+
+
+async def _with_fallback(model: str, call: Callable[[str], Awaitable], tokens: int):
+    """
+    Call `call(model)` once `tokens` of rate-limit capacity are free, falling
+    back along the configured model chain while a model's circuit is open.
+    Raises CircuitOpenError if every model is open.
+    """
+    error = None
+    for candidate in circuit_breakers.chain(model):
+        if candidate != model:
+            logger.warning("Circuit for %s is open; falling back to %s", model, candidate)
+        sent = False
+
+        async def send():
+            nonlocal sent
+            sent = True
+            return await call(candidate)
+
+        async def attempt():
+            nonlocal sent
+            sent = False
+            return await _guarded(candidate, send, tokens)
+
+        try:
+            # Transient 429/5xx/timeouts are retried with backoff, within a deadline and retry budget
+            return await retry_policy.run(attempt)
+        except CircuitOpenError as exc:
+            error = error or exc
+        except DeadlineExceeded:
+            # A request cut off by the deadline counts against upstream; one still queued for local
+            # RPM/TPM capacity says nothing about upstream health
+            if sent:
+                circuit_breakers.get(candidate).record_failure()
+            raise
+    raise error
+
+
+async def _attempt_chat_completion(payload: dict, hedge: bool = False) -> dict:
+    # Called once rate-limit capacity for this request has been acquired
+    model = payload["model"]
+    estimated = _estimate_tokens(payload)
+    if not hedge:
+        return await _post_upstream(payload, estimated)
+
+    async def duplicate() -> dict:
+        # A hedge is a real upstream request, so it needs capacity of its own
+        with span("openai.rate_limit", model=model, hedge=True):
+            await rate_limiter.acquire(model, estimated)
+        return await _post_upstream(payload, estimated)
+
+    # Hedged and timed from the HTTP call on, so time queued for capacity never looks like a slow upstream
+    return await hedger.run(model, lambda: _post_upstream(payload, estimated), duplicate)
+
+
+async def _post_upstream(payload: dict, estimated: int) -> dict:
+    client = await get_client()
+    with span("openai.http", model=payload["model"]), track_upstream(payload["model"]):
+        resp = await client.post(OPENAI_CHAT_URL, json=payload)
+        resp.raise_for_status()
+        data = resp.json()
+
+    usage = data.get("usage") or {}
+    record_usage(payload["model"], usage)
+    if "total_tokens" in usage:
+        rate_limiter.reconcile(payload["model"], estimated, usage["total_tokens"])
+    return data
+
+
+async def _send_chat_completion(payload: dict, hedge: bool = False) -> dict:
+    async def call(model: str) -> dict:
+        # With hedging, a duplicate is fired if the HTTP call is slower than the model's recent p95
+        return await _attempt_chat_completion({**payload, "model": model}, hedge)
+
+    return await _with_fallback(payload["model"], call, _estimate_tokens(payload))
+
+
+async def _post_chat_completion(payload: dict, use_cache: bool = True, hedge: bool = False) -> dict:
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    key = cache_key(payload)
+    if use_cache:
+        cached = response_cache.get(key)
+        record_cache("response", cached is not None)
+        if cached is not None:
+            return cached
+
+    # Identical requests already in flight share a single upstream call
+    data = await _singleflight.do(key, lambda: _send_chat_completion(payload, hedge))
+
+    if use_cache:
+        response_cache.set(key, data)
+    return data
+
+
+async def _stream_chat_completion(payload: dict) -> AsyncIterator[str]:
+    """Yield content deltas from a `stream=True` chat completion."""
+    async def open_stream(model: str) -> httpx.Response:
+        client = await get_client()
+        request = client.build_request("POST", OPENAI_CHAT_URL, json={**payload, "model": model, "stream": True})
+        # Timed to the response headers; the streamed body is covered by the HTTP route histogram
+        with span("openai.http", model=model, stream=True), track_upstream(model):
+            resp = await client.send(request, stream=True)
+            if resp.is_error:
+                await resp.aread()
+                await resp.aclose()
+                resp.raise_for_status()
+        return resp
+
+    # Only opening the stream is retried; once deltas flow they can't be replayed
+    resp = await _with_fallback(payload["model"], open_stream, _estimate_tokens(payload))
+    try:
+        async for line in resp.aiter_lines():
+            # Upstream sends SSE lines: "data: {...}", terminated by "data: [DONE]"
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or []
+            if not choices:
+                continue
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+    finally:
+        await resp.aclose()
+
+# Transcribe base64-encoded audio with the local Whisper model loaded at startup
+async def transcribe_audio(audio_base64: str, language: Optional[str] = None) -> str:
+    try:
+        data = base64.b64decode(audio_base64, validate=True)
+    except binascii.Error as exc:
+        raise AudioDecodeError("audio_base64 is not valid base64") from exc
+    return await transcriber.transcribe(data, language)
 
 # Function to interact with OpenAI GPT-4 (intent/plan extraction)
-async def get_trip_plan(conversation: str):
-    url = "https://api.openai.com/v1/chat/completions"
+@span("get_trip_plan")
+async def get_trip_plan(conversation: str, use_cache: bool = True):
     payload = {
-        "model": "gpt-4",
+        "model": model_router.route("trip", conversation).model,
         "messages": [
             {"role": "system", "content": "You are a helpful travel planning assistant. Extract itinerary, budget, group info from user requests."},
             {"role": "user", "content": conversation}
         ],
         "max_tokens": 500,
     }
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(url, json=payload, headers=headers, timeout=60)
-        resp.raise_for_status()
-    answer = resp.json()["choices"][0]["message"]["content"]
+    data = await _post_chat_completion(payload, use_cache)
+    answer = data["choices"][0]["message"]["content"]
     return answer
 
-# Function to handle chat conversations with OpenAI
-async def chat_completion(messages: List[ChatMessage]):
-    url = "https://api.openai.com/v1/chat/completions"
+# Summarize older chat turns; runs in the background, off the request path
+@span("summarize_conversation")
+async def summarize_conversation(previous_summary: str, messages: List[ChatMessage]) -> str:
+    transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in messages)
+    if previous_summary:
+        transcript = f"Summary so far: {previous_summary}\n\n{transcript}"
+    payload = {
+        "model": SUMMARY_MODEL,
+        "messages": [
+            {"role": "system", "content": "Summarize this travel-planning conversation in a few sentences. Keep destinations, dates, budget, group size and decisions already made."},
+            {"role": "user", "content": transcript}
+        ],
+        "max_tokens": 300,
+    }
+    data = await _post_chat_completion(payload)
+    return data["choices"][0]["message"]["content"]
+
+context_window = ContextWindow(summarize_conversation)
 
+def _chat_payload(messages: List[ChatMessage], session_id: Optional[str] = None) -> dict:
+    # Keep the prompt within the token budget; older turns become a rolling summary
+    messages = context_window.fit(messages, key=session_id)
     # Convert our ChatMessage objects to the format expected by OpenAI API
     formatted_messages = [{"role": msg.role, "content": msg.content} for msg in messages]
 
-    payload = {
-        "model": "gpt-4",  # You can change this to other models like "gpt-3.5-turbo" if needed
+    # Small talk goes to the small/fast tier, planning questions to the large one
+    latest = next((msg.content for msg in reversed(messages) if msg.role == "user"), "")
+    decision = model_router.route("chat", latest, turns=len(messages))
+
+    return {
+        "model": decision.model,  # tiers are configured via ROUTER_SMALL_MODEL / ROUTER_LARGE_MODEL
         "messages": formatted_messages,
         "max_tokens": 1000,
     }
 
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(url, json=payload, headers=headers, timeout=60)
-        resp.raise_for_status()
-
-    response_content = resp.json()["choices"][0]["message"]["content"]
+# Function to handle chat conversations with OpenAI
+@span("chat_completion")
+async def chat_completion(messages: List[ChatMessage], session_id: Optional[str] = None,
+                          use_cache: bool = True, hedge: bool = OPENAI_HEDGE_ENABLED):
+    data = await _post_chat_completion(_chat_payload(messages, session_id), use_cache, hedge)
+    response_content = data["choices"][0]["message"]["content"]
     return ChatMessage(role="assistant", content=response_content)
+
+# Streaming variant of chat_completion: yields content deltas as they arrive
+@span("chat_completion_stream")
+async def chat_completion_stream(messages: List[ChatMessage], session_id: Optional[str] = None) -> AsyncIterator[str]:
+    async for delta in _stream_chat_completion(_chat_payload(messages, session_id)):
+        yield delta
@@ -2,6 +2,9 @@
 
 import asyncio
 from openai_client import get_trip_plan
+from metrics import record_cache
+from tracing import span
+from semantic_cache import SEMANTIC_CACHE_ENABLED, trip_plan_cache
 
 # Stub for future specialized functions:
 # async def find_flight(details): ...
@@ -9,7 +12,8 @@ from openai_client import get_trip_plan
 # async def recommend_things(details): ...
 # async def calculate_budget(details): ...
 
-async def orchestrate_trip(conversation: str):
+@span("orchestrate_trip")
+async def orchestrate_trip(conversation: str, use_cache: bool = True):
     """
     This acts as the 'Orchestrator Agent'.
     It will (for now) call GPT for the plan,
@@ -19,11 +23,22 @@ async def orchestrate_trip(conversation: str):
     # e.g., destination, dates, preferences
     # TODO: Based on parsed intent, initiate sub-agents
 
+    # Paraphrases of a request we already planned reuse that plan
+    use_semantic_cache = use_cache and SEMANTIC_CACHE_ENABLED
+    if use_semantic_cache:
+        hit = trip_plan_cache.lookup(conversation)
+        record_cache("trip_plan", hit is not None)
+        if hit is not None:
+            return hit[0]
+
     # For now: Single call to GPT-4, but stub the structure.
-    trip_plan = await get_trip_plan(conversation)
+    trip_plan = await get_trip_plan(conversation, use_cache=use_cache)
 
-    return {
+    result = {
         "itinerary": trip_plan,
         # TODO: Add more structured outputs once specialized agents are in place
     }
+    if use_semantic_cache:
+        trip_plan_cache.insert(conversation, result)
+    return result
 
@@ -0,0 +1,263 @@
+# rate_limiter.py
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from metrics import RATE_LIMIT_QUEUE_DEPTH, RATE_LIMIT_WAIT
+
+load_dotenv()
+
+# Off unless configured (0 = unlimited). Defaults apply to every model; set them per model with
+# OPENAI_RATE_LIMITS="gpt-4=500:10000,gpt-3.5-turbo=3500:60000" (rpm:tpm)
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "0"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "0"))
+OPENAI_RATE_LIMITS = os.getenv("OPENAI_RATE_LIMITS", "")
+# Requests that would queue longer than this for capacity are rejected at once (0 = wait indefinitely)
+OPENAI_RATE_LIMIT_MAX_WAIT = float(os.getenv("OPENAI_RATE_LIMIT_MAX_WAIT", "10"))
+
+
+def _parse_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (int(rpm or 0), int(tpm or 0))
+    return limits
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"rate limit queue for {model} is full")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class Clock:
+    def now(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """Clock that only moves when `advance` is called; for tests and simulations."""
+
+    def __init__(self, start: float = 0.0):
+        self._now = start
+        self._sleepers: List[Tuple[float, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    def now(self) -> float:
+        return self._now
+
+    async def sleep(self, seconds: float):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self._now + max(seconds, 0.0), next(self._seq), future))
+        await future
+
+    async def advance(self, seconds: float):
+        """Move time forward, waking sleepers in deadline order."""
+        target = self._now + seconds
+        await self._settle()
+        while self._sleepers and self._sleepers[0][0] <= target:
+            deadline, _, future = heapq.heappop(self._sleepers)
+            self._now = max(self._now, deadline)
+            if not future.done():
+                future.set_result(None)
+            await self._settle()
+        self._now = target
+        await self._settle()
+
+    @staticmethod
+    async def _settle():
+        # Let runnable tasks proceed (and possibly sleep again) before time moves
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+
+class TokenBucket:
+    """Continuously refilling bucket; `capacity` units per `period` seconds."""
+
+    def __init__(self, capacity: float, period: float, clock: Clock):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock.now()
+
+    def _refill(self):
+        now = self.clock.now()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, ahead: float = 0.0) -> float:
+        """Seconds until `amount` can be taken (0 if available now), after `ahead` units queued before it."""
+        self._refill()
+        amount = min(amount, self.capacity) + ahead
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        # Refunds and corrections; may leave the bucket in debt (negative)
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _ModelLimiter:
+    def __init__(self, rpm: int, tpm: int, clock: Clock):
+        self.requests = TokenBucket(rpm, 60.0, clock) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, 60.0, clock) if tpm > 0 else None
+        self.queue: Deque[Tuple[asyncio.Future, int]] = deque()
+        self.pump: Optional[asyncio.Task] = None
+
+    def delay(self, tokens: int) -> float:
+        delays = [0.0]
+        if self.requests is not None:
+            delays.append(self.requests.delay(1))
+        if self.tokens is not None:
+            delays.append(self.tokens.delay(tokens))
+        return max(delays)
+
+    def backlog_delay(self, tokens: int) -> float:
+        """Rough wait for a request joining the back of the queue."""
+        delays = [0.0]
+        if self.requests is not None:
+            delays.append(self.requests.delay(1, len(self.queue)))
+        if self.tokens is not None:
+            ahead = sum(min(t, self.tokens.capacity) for _, t in self.queue)
+            delays.append(self.tokens.delay(tokens, ahead))
+        return max(delays)
+
+    def take(self, tokens: int):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    def give(self, requests: int, tokens: int):
+        if self.requests is not None and requests:
+            self.requests.give(requests)
+        if self.tokens is not None and tokens:
+            self.tokens.give(tokens)
+
+
+class RateLimiter:
+    """
+    Client-side requests-per-minute and tokens-per-minute limits per model.
+    Callers that would exceed a limit are queued and admitted strictly in
+    arrival order, so a large request is never starved by smaller ones.
+    A caller that would wait longer than `wait_limit` gets RateLimitExceeded
+    straight away instead of joining the queue.
+    """
+
+    def __init__(self, rpm: int = OPENAI_RPM_LIMIT, tpm: int = OPENAI_TPM_LIMIT,
+                 per_model: Optional[Dict[str, Tuple[int, int]]] = None, clock: Optional[Clock] = None,
+                 wait_limit: float = OPENAI_RATE_LIMIT_MAX_WAIT):
+        self.default_limits = (rpm, tpm)
+        self.wait_limit = wait_limit
+        self.per_model = per_model if per_model is not None else _parse_limits(OPENAI_RATE_LIMITS)
+        self.clock = clock or Clock()
+        self._models: Dict[str, _ModelLimiter] = {}
+        self.admitted = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.rejected = 0
+
+    def _limiter(self, model: str) -> _ModelLimiter:
+        limiter = self._models.get(model)
+        if limiter is None:
+            rpm, tpm = self.per_model.get(model, self.default_limits)
+            limiter = self._models[model] = _ModelLimiter(rpm, tpm, self.clock)
+        return limiter
+
+    def queue_depth(self, model: Optional[str] = None) -> int:
+        if model is not None:
+            return len(self._models[model].queue) if model in self._models else 0
+        return sum(len(limiter.queue) for limiter in self._models.values())
+
+    async def acquire(self, model: str, tokens: int):
+        """
+        Wait until one request of `tokens` estimated tokens may be sent.
+        Raises RateLimitExceeded if that would take longer than `wait_limit`.
+        """
+        limiter = self._limiter(model)
+        start = self.clock.now()
+        if not limiter.queue and limiter.delay(tokens) == 0:
+            limiter.take(tokens)
+            self._record(model, 0.0)
+            return
+        if self.wait_limit > 0:
+            expected = limiter.backlog_delay(tokens)
+            if expected > self.wait_limit:
+                self.rejected += 1
+                raise RateLimitExceeded(model, expected)
+
+        future = asyncio.get_running_loop().create_future()
+        limiter.queue.append((future, tokens))
+        self.queued += 1
+        depth = RATE_LIMIT_QUEUE_DEPTH.labels(model)
+        depth.inc()
+        if limiter.pump is None or limiter.pump.done():
+            limiter.pump = asyncio.ensure_future(self._pump(limiter))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up: hand the capacity back
+                limiter.give(1, tokens)
+            raise
+        finally:
+            depth.dec()
+        self._record(model, self.clock.now() - start)
+
+    def reconcile(self, model: str, estimated: int, actual: int):
+        """Correct the token bucket once the real usage of a request is known."""
+        if model in self._models:
+            self._models[model].give(0, estimated - actual)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "total_wait_seconds": self.total_wait,
+            "max_wait_seconds": self.max_wait,
+            "rejected": self.rejected,
+        }
+
+    def _record(self, model: str, waited: float):
+        RATE_LIMIT_WAIT.labels(model).observe(waited)
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    async def _pump(self, limiter: _ModelLimiter):
+        while limiter.queue:
+            future, tokens = limiter.queue[0]
+            if future.done():  # caller cancelled while queued
+                limiter.queue.popleft()
+                continue
+            delay = limiter.delay(tokens)
+            if delay > 0:
+                await self.clock.sleep(delay)
+                continue
+            limiter.take(tokens)
+            limiter.queue.popleft()
+            future.set_result(None)
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,144 @@
+# retry_policy.py
+
+import asyncio
+import logging
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from rate_limiter import Clock
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OPENAI_MAX_ATTEMPTS = int(os.getenv("OPENAI_MAX_ATTEMPTS", "4"))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "20"))
+OPENAI_REQUEST_DEADLINE = float(os.getenv("OPENAI_REQUEST_DEADLINE", "90"))
+# Retries may add at most this fraction of extra load on top of first attempts
+OPENAI_RETRY_BUDGET_RATIO = float(os.getenv("OPENAI_RETRY_BUDGET_RATIO", "0.2"))
+OPENAI_RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("OPENAI_RETRY_BUDGET_MIN_PER_SECOND", "1"))
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+class DeadlineExceeded(Exception):
+    """The per-request deadline ran out before an attempt succeeded."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    # Timeouts, connection resets, protocol errors
+    return isinstance(exc, httpx.TransportError)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Server-requested delay in seconds from `retry-after-ms` / `Retry-After`, if any."""
+    if not isinstance(exc, httpx.HTTPStatusError):
+        return None
+    headers = exc.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return max(float(headers["retry-after-ms"]) / 1000, 0.0)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        if value.strip().isdigit():
+            return float(value)
+        when = parsedate_to_datetime(value)
+        return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of first attempts (plus a small steady
+    allowance), so an upstream outage can't be multiplied into a retry storm.
+    """
+
+    def __init__(self, ratio: float = OPENAI_RETRY_BUDGET_RATIO,
+                 min_per_second: float = OPENAI_RETRY_BUDGET_MIN_PER_SECOND,
+                 clock: Optional[Clock] = None):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.clock = clock or Clock()
+        # Never bank more than ~10 s worth of allowance
+        self.max_balance = max(10 * min_per_second, 1.0)
+        self.balance = self.max_balance
+        self.updated = self.clock.now()
+        self.exhausted = 0
+
+    def _refill(self):
+        now = self.clock.now()
+        self.balance = min(self.max_balance, self.balance + (now - self.updated) * self.min_per_second)
+        self.updated = now
+
+    def deposit(self):
+        self._refill()
+        self.balance = min(self.max_balance, self.balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self.balance >= 1:
+            self.balance -= 1
+            return True
+        self.exhausted += 1
+        return False
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring Retry-After, within a deadline."""
+
+    def __init__(self, max_attempts: int = OPENAI_MAX_ATTEMPTS, base_delay: float = OPENAI_RETRY_BASE_DELAY,
+                 max_delay: float = OPENAI_RETRY_MAX_DELAY, deadline: float = OPENAI_REQUEST_DEADLINE,
+                 budget: Optional[RetryBudget] = None, clock: Optional[Clock] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.clock = clock or Clock()
+        self.budget = budget if budget is not None else RetryBudget(clock=self.clock)
+        self.retries = 0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    async def run(self, fn: Callable[[], Awaitable], deadline: Optional[float] = None):
+        """Call `fn` until it succeeds, fails permanently, or time/budget runs out."""
+        deadline = self.deadline if deadline is None else deadline
+        expires_at = self.clock.now() + deadline
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = expires_at - self.clock.now()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"deadline of {deadline:.1f}s exceeded after {attempt - 1} attempts")
+            try:
+                return await asyncio.wait_for(fn(), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(f"deadline of {deadline:.1f}s exceeded on attempt {attempt}")
+            except Exception as exc:
+                if not is_retryable(exc) or attempt >= self.max_attempts:
+                    raise
+                requested = retry_after(exc)
+                delay = requested if requested is not None else self.backoff(attempt)
+                if self.clock.now() + delay >= expires_at:
+                    raise
+                if not self.budget.try_withdraw():
+                    logger.warning("Retry budget exhausted; not retrying %r", exc)
+                    raise
+                self.retries += 1
+                logger.info("Retrying upstream call in %.2fs (attempt %d): %r", delay, attempt, exc)
+            await self.clock.sleep(delay)
+
+
+retry_policy = RetryPolicy()
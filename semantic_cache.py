@@ -0,0 +1,193 @@
+# semantic_cache.py
+
+import os
+import re
+import time
+import zlib
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "4096"))
+SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "2048"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+# Content words the cached request may have that the query lacks; a word only the query has
+# (an extra requirement like "vegan" or "wheelchair") is always a miss
+SEMANTIC_CACHE_MAX_UNSHARED = int(os.getenv("SEMANTIC_CACHE_MAX_UNSHARED", "0"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+
+_SYNONYMS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6",
+    "seven": "7", "eight": "8", "nine": "9", "ten": "10", "eleven": "11", "twelve": "12",
+    "a couple": "2", "couple": "2", "pair": "2", "single": "1", "solo": "1",
+    "week": "7 days", "weekend": "2 days", "fortnight": "14 days",
+}
+_SYNONYMS_RE = re.compile(r"\b(" + "|".join(sorted(_SYNONYMS, key=len, reverse=True)) + r")\b")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an the of for to in on at and or with me us we our i my you your "
+    "please plan trip would like want need can could some it is are be "
+    "people persons person going go travel traveller visit visiting holiday vacation".split()
+)
+# Words that flip or narrow a request; never tolerated as an unshared word
+_STRICT = frozenset(
+    "no not without except excluding exclude avoid skip only instead "
+    "january february march april may june july august september october november december".split()
+)
+# Words that give a number its meaning ("3 days" vs "3 rooms"); a bare
+# number or one followed by "adults"/"guests" is read as the group size
+_UNITS = frozenset(
+    "day night week month hour child kid room star euro eur dollar usd km".split()
+)
+
+
+def _normalize(text: str) -> List[str]:
+    text = _SYNONYMS_RE.sub(lambda m: _SYNONYMS[m.group(1)], text.lower())
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token in _STOPWORDS:
+            continue
+        # Crude stemming so "day"/"days", "night"/"nights" collide
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+            if token in _STOPWORDS:
+                continue
+        tokens.append(token)
+    return tokens
+
+
+class HashedNgramEmbedder:
+    """
+    Offline text embedding: word unigrams, adjacent word pairs and character
+    n-grams hashed (signed) into a fixed number of buckets, L2-normalized.
+    """
+
+    def __init__(self, dim: int = SEMANTIC_CACHE_DIM, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def features(self, text: str) -> List[str]:
+        tokens = _normalize(text)
+        features = [f"w:{t}" for t in tokens]
+        features += [f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+        lo, hi = self.ngram_range
+        for token in tokens:
+            padded = f"<{token}>"
+            for n in range(lo, hi + 1):
+                features += [f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1)]
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        features = self.features(text)
+        if not features:
+            return vector
+        hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+        buckets = (hashes % self.dim).astype(np.intp)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, buckets, signs)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+def _numbers(text: str) -> Tuple[Tuple[str, str], ...]:
+    """Numbers in the request, each bound to the unit word that follows it."""
+    tokens = _normalize(text) + [""]
+    return tuple(sorted(
+        (token, tokens[i + 1] if tokens[i + 1] in _UNITS else "")
+        for i, token in enumerate(tokens[:-1]) if token.isdigit()
+    ))
+
+
+def _unshared_ok(cached: frozenset, query: frozenset, max_unshared: int) -> bool:
+    dropped = cached - query
+    return not query - cached and len(dropped) <= max_unshared and not dropped & _STRICT
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache over a contiguous float32 matrix of unit vectors.
+    A lookup is one matrix-vector product; a hit needs cosine similarity
+    above `threshold`, the same numbers (days, travellers, budget) as the
+    cached request, no content word the cached request lacks, and at most
+    `max_unshared` content words missing from the query (never a negation
+    or a month). Entries expire after
+    `ttl` seconds; expired, then least recently used, rows are overwritten.
+    """
+
+    def __init__(self, capacity: int = SEMANTIC_CACHE_CAPACITY, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 embedder: Optional[HashedNgramEmbedder] = None, max_unshared: int = SEMANTIC_CACHE_MAX_UNSHARED,
+                 ttl: float = SEMANTIC_CACHE_TTL):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.max_unshared = max_unshared
+        self.ttl = ttl
+        self.embedder = embedder or HashedNgramEmbedder()
+        self._matrix = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._values: List[Any] = [None] * capacity
+        self._numbers: List[tuple] = [()] * capacity
+        self._tokens: List[frozenset] = [frozenset()] * capacity
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self._size
+
+    def lookup(self, text: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, similarity) for the closest cached request, or None."""
+        if self._size:
+            now = time.monotonic()
+            query = self.embedder.embed(text)
+            scores = self._matrix[:self._size] @ query
+            scores[self._expires_at[:self._size] <= now] = -np.inf
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if (score >= self.threshold and self._numbers[best] == _numbers(text)
+                    and _unshared_ok(self._tokens[best], frozenset(_normalize(text)), self.max_unshared)):
+                self._last_used[best] = now
+                self.hits += 1
+                return self._values[best], score
+        self.misses += 1
+        return None
+
+    def insert(self, text: str, value: Any):
+        now = time.monotonic()
+        expired = np.flatnonzero(self._expires_at[:self._size] <= now)
+        if len(expired):
+            slot = int(expired[0])
+        elif self._size < self.capacity:
+            slot = self._size
+            self._size += 1
+        else:
+            slot = int(np.argmin(self._last_used))
+        self._matrix[slot] = self.embedder.embed(text)
+        self._values[slot] = value
+        self._numbers[slot] = _numbers(text)
+        self._tokens[slot] = frozenset(_normalize(text))
+        self._last_used[slot] = now
+        self._expires_at[slot] = now + self.ttl
+
+    def clear(self):
+        self._size = 0
+        self._values = [None] * self.capacity
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+trip_plan_cache = SemanticCache()
@@ -0,0 +1,172 @@
+# session_store.py
+
+import os
+import sqlite3
+import uuid
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+from dotenv import load_dotenv
+
+from models import ChatMessage
+
+load_dotenv()
+
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH")  # unset = memory only
+
+
+def _message_bytes(message: ChatMessage) -> int:
+    return len(message.role) + len(message.content.encode("utf-8"))
+
+
+class SQLiteSessionBacking:
+    """
+    Durable copy of every session, so sessions evicted from memory
+    (or lost on restart) can be reloaded on demand.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_messages ("
+            " session_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " role TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " PRIMARY KEY (session_id, seq))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY)"
+        )
+        self.conn.commit()
+
+    def create(self, session_id: str):
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO sessions VALUES (?)", (session_id,))
+
+    def exists(self, session_id: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row is not None
+
+    def load(self, session_id: str) -> List[ChatMessage]:
+        rows = self.conn.execute(
+            "SELECT role, content FROM session_messages WHERE session_id = ? ORDER BY seq",
+            (session_id,),
+        ).fetchall()
+        return [ChatMessage(role=role, content=content) for role, content in rows]
+
+    def append(self, session_id: str, start_seq: int, messages: List[ChatMessage]):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO session_messages VALUES (?, ?, ?, ?)",
+                [(session_id, start_seq + i, m.role, m.content) for i, m in enumerate(messages)],
+            )
+
+    def delete(self, session_id: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        self.conn.close()
+
+
+class SessionStore:
+    """
+    Bounded in-memory LRU of chat histories.
+    Evicts least recently used sessions once either the session count or
+    the total message bytes exceed their limits. With a SQLite backing,
+    evicted sessions are reloaded transparently on next access.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX_SESSIONS, max_bytes: int = SESSION_MAX_BYTES,
+                 backing: Optional[SQLiteSessionBacking] = None):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.backing = backing
+        self._sessions: "OrderedDict[str, List[ChatMessage]]" = OrderedDict()
+        self._sizes = {}
+        self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        if session_id in self._sessions:
+            return True
+        return self.backing is not None and self.backing.exists(session_id)
+
+    def create(self, messages: Iterable[ChatMessage] = ()) -> str:
+        session_id = uuid.uuid4().hex
+        if self.backing is not None:
+            self.backing.create(session_id)
+        self._put(session_id, [])
+        self.append(session_id, *messages)
+        return session_id
+
+    def get(self, session_id: str) -> List[ChatMessage]:
+        """Return a copy of the session history. Raises KeyError if unknown."""
+        return list(self._load(session_id))
+
+    def append(self, session_id: str, *messages: ChatMessage):
+        history = self._load(session_id)
+        if not messages:
+            return
+        if self.backing is not None:
+            self.backing.append(session_id, len(history), list(messages))
+        history.extend(messages)
+        added = sum(_message_bytes(m) for m in messages)
+        self._sizes[session_id] += added
+        self.total_bytes += added
+        self._evict(keep=session_id)
+
+    def delete(self, session_id: str):
+        self._drop(session_id)
+        if self.backing is not None:
+            self.backing.delete(session_id)
+
+    def close(self):
+        if self.backing is not None:
+            self.backing.close()
+
+    def _load(self, session_id: str) -> List[ChatMessage]:
+        history = self._sessions.get(session_id)
+        if history is not None:
+            self._sessions.move_to_end(session_id)
+            return history
+        if self.backing is None or not self.backing.exists(session_id):
+            raise KeyError(session_id)
+        history = self.backing.load(session_id)
+        self._put(session_id, history)
+        self._evict(keep=session_id)
+        return history
+
+    def _put(self, session_id: str, history: List[ChatMessage]):
+        size = sum(_message_bytes(m) for m in history)
+        self._sessions[session_id] = history
+        self._sizes[session_id] = size
+        self.total_bytes += size
+
+    def _drop(self, session_id: str):
+        if self._sessions.pop(session_id, None) is not None:
+            self.total_bytes -= self._sizes.pop(session_id)
+
+    def _evict(self, keep: str):
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                self._sessions.move_to_end(keep)
+                continue
+            self._drop(oldest)
+
+
+session_store = SessionStore(
+    backing=SQLiteSessionBacking(SESSION_DB_PATH) if SESSION_DB_PATH else None
+)
@@ -4,7 +4,9 @@ document.addEventListener('DOMContentLoaded', () => {
     const chatMessages = document.getElementById('chat-messages');
     const recordButton = document.getElementById('record-button');
 
-    // Store conversation history
+    // Store conversation history. The server keeps its own copy per session;
+    // this one is only used to re-seed a new session if the old one expired.
+    let sessionId = null;
     let conversationHistory = [
         { role: 'system', content: 'Hello! I\'m your AI travel assistant. How can I help you today?' }
     ];
@@ -12,6 +14,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Audio recording variables
     let mediaRecorder;
     let audioChunks = [];
+    let streamingSession = null;
     let isRecording = false;
 
     // Auto-resize textarea as user types
@@ -30,9 +33,6 @@ document.addEventListener('DOMContentLoaded', () => {
         // Add user message to UI
         addMessageToUI('user', userMessage);
 
-        // Add user message to conversation history
-        conversationHistory.push({ role: 'user', content: userMessage });
-
         // Clear input
         messageInput.value = '';
         messageInput.style.height = 'auto';
@@ -41,16 +41,27 @@ document.addEventListener('DOMContentLoaded', () => {
         const loadingElement = addLoadingIndicator();
 
         try {
-            // Send message to backend
-            const response = await sendMessageToBackend(conversationHistory);
-
-            // Remove loading indicator
+            // Stream the reply into a message bubble as tokens arrive
+            let assistantElement = null;
+            const response = await streamMessageFromBackend(userMessage, (content) => {
+                if (!assistantElement) {
+                    // Swap the loading indicator for the reply on the first token
+                    loadingElement.remove();
+                    assistantElement = addMessageToUI('assistant', '');
+                }
+                assistantElement.querySelector('.message-content').textContent = content;
+                scrollToBottom();
+            });
+
+            // Remove loading indicator (no-op if the reply already started)
             loadingElement.remove();
 
-            // Add assistant response to UI
-            addMessageToUI('assistant', response.message.content);
+            if (!assistantElement) {
+                addMessageToUI('assistant', response.message.content);
+            }
 
-            // Add assistant response to conversation history
+            // Record the completed turn in the local conversation history
+            conversationHistory.push({ role: 'user', content: userMessage });
             conversationHistory.push({ role: 'assistant', content: response.message.content });
 
             // Scroll to bottom
@@ -79,6 +90,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
         // Scroll to bottom
         scrollToBottom();
+
+        return messageElement;
     }
 
     // Function to add loading indicator
@@ -108,15 +121,17 @@ document.addEventListener('DOMContentLoaded', () => {
         chatMessages.scrollTop = chatMessages.scrollHeight;
     }
 
-    // Function to send message to backend
-    async function sendMessageToBackend(messages) {
-        const response = await fetch('/api/chat', {
+    // Function to create a server-side chat session seeded with the local history
+    async function ensureSession() {
+        if (sessionId) return sessionId;
+
+        const response = await fetch('/api/sessions', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
-                messages: messages.map(msg => ({
+                messages: conversationHistory.map(msg => ({
                     role: msg.role,
                     content: msg.content
                 }))
@@ -127,78 +142,243 @@ document.addEventListener('DOMContentLoaded', () => {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
 
-        return await response.json();
+        sessionId = (await response.json()).session_id;
+        return sessionId;
+    }
+
+    // Function to post only the new message to the session; recreates the
+    // session once if the server has forgotten it (eviction or restart)
+    async function postToSession(path, content, headers) {
+        for (let attempt = 0; attempt < 2; attempt++) {
+            const id = await ensureSession();
+            const response = await fetch(`/api/sessions/${id}/${path}`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    ...headers
+                },
+                body: JSON.stringify({ content })
+            });
+            if (response.status !== 404) return response;
+            sessionId = null;
+        }
+        throw new Error('HTTP error! status: 404');
+    }
+
+    // Function to stream a reply from the backend over Server-Sent Events.
+    // Calls onUpdate with the text so far; resolves with a ChatResponse-shaped object.
+    async function streamMessageFromBackend(userMessage, onUpdate) {
+        const response = await postToSession('chat/stream', userMessage, {
+            'Accept': 'text/event-stream'
+        });
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let content = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let data = '';
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                }
+
+                const payload = JSON.parse(data);
+                if (eventName === 'done') {
+                    return payload;
+                }
+                if (eventName === 'error') {
+                    throw new Error(payload.detail);
+                }
+                content += payload.delta;
+                onUpdate(content);
+            }
+        }
+
+        // Stream ended without a final event
+        return { message: { role: 'assistant', content } };
     }
 
     // Initial scroll to bottom
     scrollToBottom();
 
-    // Handle record button click
-    recordButton.addEventListener('click', async () => {
-        if (!isRecording) {
-            // Start recording
-            try {
-                const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-                mediaRecorder = new MediaRecorder(stream);
-                audioChunks = [];
-
-                mediaRecorder.addEventListener('dataavailable', event => {
-                    audioChunks.push(event.data);
-                });
+    // Show a (partial or final) transcript in the input box
+    function showTranscript(text) {
+        messageInput.value = text;
+        messageInput.style.height = 'auto';
+        messageInput.style.height = (messageInput.scrollHeight) + 'px';
+    }
 
-                mediaRecorder.addEventListener('stop', async () => {
-                    // Convert audio chunks to base64
-                    const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
-                    const reader = new FileReader();
-
-                    reader.onloadend = async () => {
-                        const base64Audio = reader.result.split(',')[1];
-
-                        // Show loading indicator
-                        const loadingElement = addLoadingIndicator();
-
-                        try {
-                            // Send audio to backend
-                            const response = await fetch('/api/voice/process', {
-                                method: 'POST',
-                                headers: {
-                                    'Content-Type': 'application/json'
-                                },
-                                body: JSON.stringify({
-                                    audio_base64: base64Audio
-                                })
-                            });
-
-                            if (!response.ok) {
-                                throw new Error(`HTTP error! status: ${response.status}`);
-                            }
-
-                            const data = await response.json();
-
-                            // Remove loading indicator
-                            loadingElement.remove();
-
-                            // Add transcribed text to input
-                            messageInput.value = data.transcript;
-                            messageInput.style.height = 'auto';
-                            messageInput.style.height = (messageInput.scrollHeight) + 'px';
-                            messageInput.focus();
-
-                        } catch (error) {
-                            // Remove loading indicator
-                            loadingElement.remove();
-
-                            // Show error message
-                            addMessageToUI('system', 'Sorry, there was an error processing your audio. Please try again.');
-                            console.error('Error:', error);
+    // Audio worklet that batches microphone samples into ~100 ms frames
+    const captureWorkletSource = `
+        class PcmCapture extends AudioWorkletProcessor {
+            constructor() {
+                super();
+                this.frame = new Float32Array(Math.round(sampleRate / 10));
+                this.length = 0;
+            }
+            process(inputs) {
+                const channel = inputs[0][0];
+                if (channel) {
+                    for (let i = 0; i < channel.length; i++) {
+                        this.frame[this.length++] = channel[i];
+                        if (this.length === this.frame.length) {
+                            this.port.postMessage(this.frame.slice(0));
+                            this.length = 0;
                         }
-                    };
+                    }
+                }
+                return true;
+            }
+        }
+        registerProcessor('pcm-capture', PcmCapture);
+    `;
+
+    // Live dictation: stream 16-bit PCM over a WebSocket and show partial transcripts as they arrive
+    async function startStreamingRecording() {
+        const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+        const audioContext = new AudioContext();
+        const moduleUrl = URL.createObjectURL(new Blob([captureWorkletSource], { type: 'application/javascript' }));
+        await audioContext.audioWorklet.addModule(moduleUrl);
+        URL.revokeObjectURL(moduleUrl);
+
+        const protocol = location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${protocol}://${location.host}/ws/voice?sample_rate=${audioContext.sampleRate}`);
+        socket.binaryType = 'arraybuffer';
+        await new Promise((resolve, reject) => {
+            socket.onopen = resolve;
+            socket.onerror = reject;
+        });
+
+        let loadingElement = null;
+        const finish = () => {
+            if (loadingElement) {
+                loadingElement.remove();
+                loadingElement = null;
+            }
+        };
+        socket.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            if (data.type === 'partial') {
+                showTranscript(data.text);
+            } else if (data.type === 'final') {
+                finish();
+                showTranscript(data.text);
+                messageInput.focus();
+            } else if (data.type === 'error') {
+                finish();
+                addMessageToUI('system', 'Sorry, there was an error processing your audio. Please try again.');
+                console.error('Error:', data.detail);
+            }
+        };
+        socket.onclose = finish;
+
+        const source = audioContext.createMediaStreamSource(stream);
+        const capture = new AudioWorkletNode(audioContext, 'pcm-capture');
+        capture.port.onmessage = (event) => {
+            if (socket.readyState !== WebSocket.OPEN) return;
+            const samples = event.data;
+            const pcm = new Int16Array(samples.length);
+            for (let i = 0; i < samples.length; i++) {
+                pcm[i] = Math.max(-1, Math.min(1, samples[i])) * 0x7fff;
+            }
+            socket.send(pcm.buffer);
+        };
+        source.connect(capture);
+
+        return {
+            stop() {
+                capture.port.onmessage = null;
+                source.disconnect();
+                stream.getTracks().forEach(track => track.stop());
+                audioContext.close();
+                if (socket.readyState === WebSocket.OPEN) {
+                    socket.send(JSON.stringify({ type: 'stop' }));
+                    loadingElement = addLoadingIndicator();
+                }
+            }
+        };
+    }
 
-                    reader.readAsDataURL(audioBlob);
+    // Fallback for browsers without AudioWorklet: record the whole clip, then upload it
+    async function startUploadRecording() {
+        const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+        mediaRecorder = new MediaRecorder(stream);
+        audioChunks = [];
+
+        mediaRecorder.addEventListener('dataavailable', event => {
+            audioChunks.push(event.data);
+        });
+
+        mediaRecorder.addEventListener('stop', async () => {
+            const audioBlob = new Blob(audioChunks, { type: mediaRecorder.mimeType || 'audio/webm' });
+
+            // Show loading indicator
+            const loadingElement = addLoadingIndicator();
+
+            try {
+                // Send the recording as the raw request body (no base64 round trip)
+                const response = await fetch('/api/voice/upload', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': audioBlob.type
+                    },
+                    body: audioBlob
                 });
 
-                // Start recording
-                mediaRecorder.start();
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+
+                const data = await response.json();
+
+                // Remove loading indicator
+                loadingElement.remove();
+
+                // Add transcribed text to input
+                showTranscript(data.transcript);
+                messageInput.focus();
+
+            } catch (error) {
+                // Remove loading indicator
+                loadingElement.remove();
+
+                // Show error message
+                addMessageToUI('system', 'Sorry, there was an error processing your audio. Please try again.');
+                console.error('Error:', error);
+            }
+        });
+
+        // Start recording
+        mediaRecorder.start();
+    }
+
+    // Handle record button click
+    recordButton.addEventListener('click', async () => {
+        if (!isRecording) {
+            // Start recording
+            try {
+                if (window.AudioWorkletNode && window.WebSocket) {
+                    streamingSession = await startStreamingRecording();
+                } else {
+                    await startUploadRecording();
+                }
                 isRecording = true;
                 recordButton.classList.add('recording');
 
@@ -208,15 +388,17 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         } else {
             // Stop recording
-            if (mediaRecorder && mediaRecorder.state !== 'inactive') {
+            if (streamingSession) {
+                streamingSession.stop();
+                streamingSession = null;
+            } else if (mediaRecorder && mediaRecorder.state !== 'inactive') {
                 mediaRecorder.stop();
 
                 // Stop all audio tracks
                 mediaRecorder.stream.getTracks().forEach(track => track.stop());
-
-                isRecording = false;
-                recordButton.classList.remove('recording');
             }
+            isRecording = false;
+            recordButton.classList.remove('recording');
         }
     });
 });
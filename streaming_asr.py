@@ -0,0 +1,142 @@
+# streaming_asr.py
+
+import os
+from typing import List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from transcriber import SAMPLE_RATE, Transcriber, transcriber
+from vad import quietest_cut, trim
+
+load_dotenv()
+
+# Audio transcribed per partial; kept under Whisper's 30 s context
+STREAM_WINDOW_SECONDS = float(os.getenv("STREAM_WINDOW_SECONDS", "20"))
+# New audio needed before another partial transcript is produced
+STREAM_PARTIAL_INTERVAL = float(os.getenv("STREAM_PARTIAL_INTERVAL", "1.0"))
+# Longest stream accepted on one connection
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", "600"))
+# Input rates accepted from clients; telephone audio up to studio audio
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+# When the window is full, cut at the quietest 100 ms in its last few seconds
+_CUT_SEARCH = 3 * SAMPLE_RATE
+# Committed text passed to Whisper as context for the next window
+_PROMPT_CHARS = 200
+
+
+class StreamTooLong(Exception):
+    pass
+
+
+class InvalidFrame(Exception):
+    pass
+
+
+def pcm16_to_float(frame: bytes) -> np.ndarray:
+    if len(frame) % 2:
+        raise InvalidFrame("audio frames must hold whole 16-bit samples")
+    return np.frombuffer(frame, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def resample(audio: np.ndarray, rate: int, target: int = SAMPLE_RATE) -> np.ndarray:
+    """Linear-interpolation resampling; plenty for speech going into Whisper's 16 kHz front end."""
+    if rate == target or not len(audio):
+        return audio
+    n = int(round(len(audio) * target / rate))
+    positions = np.arange(n, dtype=np.float64) * (rate / target)
+    return np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+
+class StreamingTranscription:
+    """
+    Incremental transcript of a live audio stream (16-bit mono PCM frames).
+
+    Every STREAM_PARTIAL_INTERVAL seconds of new audio, the uncommitted
+    tail (at most one window) is re-transcribed as a partial. Once the
+    tail outgrows the window, its head up to the quietest moment near
+    the window's end is transcribed one last time and committed, so a
+    final transcript only has to process the audio since the last cut.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, language: Optional[str] = None,
+                 window: float = STREAM_WINDOW_SECONDS, partial_interval: float = STREAM_PARTIAL_INTERVAL,
+                 max_seconds: float = STREAM_MAX_SECONDS, engine: Transcriber = transcriber):
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}")
+        self.sample_rate = sample_rate
+        self.language = language
+        self.window = int(window * SAMPLE_RATE)
+        self.partial_interval = int(partial_interval * SAMPLE_RATE)
+        self.max_samples = int(max_seconds * SAMPLE_RATE)
+        self.engine = engine
+        self.committed: List[str] = []
+        self._chunks: List[np.ndarray] = []
+        self._buffered = 0
+        self._received = 0
+        self._since_partial = 0
+
+    @property
+    def seconds(self) -> float:
+        return self._received / SAMPLE_RATE
+
+    def feed(self, frame: bytes):
+        # Checked on the input size, so an oversized frame is refused before it is resampled
+        incoming = int(round(len(frame) // 2 * SAMPLE_RATE / self.sample_rate))
+        if self._received + incoming > self.max_samples:
+            raise StreamTooLong(f"streams are limited to {self.max_samples // SAMPLE_RATE} seconds")
+        audio = resample(pcm16_to_float(frame), self.sample_rate)
+        self._received += len(audio)
+        self._chunks.append(audio)
+        self._buffered += len(audio)
+        self._since_partial += len(audio)
+
+    def partial_due(self) -> bool:
+        return self._since_partial >= self.partial_interval
+
+    def text(self, tail: str = "") -> str:
+        return " ".join(t for t in self.committed + [tail] if t)
+
+    async def partial(self) -> str:
+        """Transcript so far: committed text plus a fresh guess at the uncommitted tail."""
+        await self._commit_overflow()
+        audio = self._audio()
+        self._since_partial = 0
+        if not len(audio):
+            return self.text()
+        return self.text(await self._transcribe(audio))
+
+    async def finish(self) -> str:
+        await self._commit_overflow()
+        audio = self._audio()
+        tail = await self._transcribe(audio) if len(audio) else ""
+        return self.text(tail)
+
+    def _audio(self) -> np.ndarray:
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0] if self._chunks else np.zeros(0, dtype=np.float32)
+
+    def _drop(self, samples: int):
+        audio = self._audio()
+        self._chunks = [audio[samples:]]
+        self._buffered -= samples
+
+    async def _commit_overflow(self):
+        while self._buffered > self.window:
+            audio = self._audio()
+            cut = quietest_cut(audio, self.window, _CUT_SEARCH)
+            text = await self._transcribe(audio[:cut])
+            # Frames fed while we were transcribing were appended after `cut`, so dropping is exact
+            self.committed.append(text)
+            self._drop(cut)
+
+    async def _transcribe(self, audio: np.ndarray) -> str:
+        # Silence (before the user starts, between sentences) never reaches the model
+        audio = trim(audio)
+        if not len(audio):
+            return ""
+        prompt = self.text()[-_PROMPT_CHARS:] or None
+        return await self.engine.transcribe_samples(audio, self.language, prompt)
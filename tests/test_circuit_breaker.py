@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+import openai_client
+from circuit_breaker import CircuitBreakers
+from retry_policy import DeadlineExceeded, RetryPolicy
+
+PAYLOAD = {"model": "gpt-4", "messages": [{"role": "user", "content": "hi"}]}
+
+
+@pytest.fixture
+def breakers(monkeypatch):
+    breakers = CircuitBreakers(fallbacks={})
+    monkeypatch.setattr(openai_client, "circuit_breakers", breakers)
+    monkeypatch.setattr(openai_client, "retry_policy", RetryPolicy(deadline=0.1))
+    return breakers
+
+
+def test_deadline_spent_queued_for_rate_limit_is_not_a_breaker_failure(breakers, monkeypatch):
+    async def backlogged_acquire(model, tokens):
+        await asyncio.sleep(1)
+
+    async def upstream(payload, estimated):
+        raise AssertionError("never sent")
+
+    monkeypatch.setattr(openai_client.rate_limiter, "acquire", backlogged_acquire)
+    monkeypatch.setattr(openai_client, "_post_upstream", upstream)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(openai_client._send_chat_completion(PAYLOAD))
+    assert breakers.get("gpt-4").failures == 0
+
+
+def test_deadline_spent_waiting_on_upstream_is_a_breaker_failure(breakers, monkeypatch):
+    async def acquire(model, tokens):
+        pass
+
+    async def hanging_upstream(payload, estimated):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(openai_client.rate_limiter, "acquire", acquire)
+    monkeypatch.setattr(openai_client, "_post_upstream", hanging_upstream)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(openai_client._send_chat_completion(PAYLOAD))
+    assert breakers.get("gpt-4").failures == 1
@@ -0,0 +1,56 @@
+import asyncio
+
+import openai_client
+from circuit_breaker import CircuitBreakers
+from hedging import Hedger
+
+PAYLOAD = {"model": "gpt-4", "messages": [{"role": "user", "content": "hi"}]}
+
+
+def test_time_queued_for_rate_limit_does_not_trigger_hedges(monkeypatch):
+    async def backlogged_acquire(model, tokens):
+        await asyncio.sleep(0.2)  # waiting behind other requests for RPM/TPM capacity
+
+    async def fast_upstream(payload, estimated):
+        await asyncio.sleep(0.01)
+        return {"id": "ok"}
+
+    hedger = Hedger(min_delay=0.05, min_samples=1)
+    hedger.tracker("gpt-4").record(0.01)
+    monkeypatch.setattr(openai_client.rate_limiter, "acquire", backlogged_acquire)
+    monkeypatch.setattr(openai_client, "_post_upstream", fast_upstream)
+    monkeypatch.setattr(openai_client, "hedger", hedger)
+    monkeypatch.setattr(openai_client, "circuit_breakers", CircuitBreakers(fallbacks={}))
+
+    result = asyncio.run(openai_client._send_chat_completion(PAYLOAD, hedge=True))
+
+    assert result == {"id": "ok"}
+    assert hedger.hedged == 0
+    # The latency sample covers the HTTP call only, not the 0.2 s spent queued
+    assert max(hedger.tracker("gpt-4").samples) < 0.1
+
+
+def test_slow_upstream_is_hedged_with_its_own_rate_limit_slot(monkeypatch):
+    acquired = []
+    calls = []
+
+    async def acquire(model, tokens):
+        acquired.append(model)
+
+    async def upstream(payload, estimated):
+        calls.append(payload["model"])
+        await asyncio.sleep(0.3 if len(calls) == 1 else 0.01)
+        return {"call": len(calls)}
+
+    hedger = Hedger(min_delay=0.05, min_samples=1)
+    hedger.tracker("gpt-4").record(0.01)
+    monkeypatch.setattr(openai_client.rate_limiter, "acquire", acquire)
+    monkeypatch.setattr(openai_client, "_post_upstream", upstream)
+    monkeypatch.setattr(openai_client, "hedger", hedger)
+    monkeypatch.setattr(openai_client, "circuit_breakers", CircuitBreakers(fallbacks={}))
+
+    result = asyncio.run(openai_client._send_chat_completion(PAYLOAD, hedge=True))
+
+    assert result == {"call": 2}
+    assert hedger.hedged == 1 and hedger.hedge_wins == 1
+    assert len(acquired) == 2
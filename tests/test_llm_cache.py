@@ -0,0 +1,22 @@
+import llm_cache
+from llm_cache import ResponseCache, SQLiteCacheTier
+
+
+def test_disk_hit_keeps_its_remaining_ttl_in_memory(tmp_path, monkeypatch):
+    wall, mono = [1000.0], [50.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: wall[0])
+    monkeypatch.setattr(llm_cache.time, "monotonic", lambda: mono[0])
+    disk = SQLiteCacheTier(str(tmp_path / "cache.db"))
+    ResponseCache(ttl=100, disk=disk).set("k", {"answer": 1})
+
+    wall[0] += 90
+    mono[0] += 90
+    cache = ResponseCache(ttl=100, disk=disk)  # e.g. another worker, memory tier empty
+    assert cache.get("k") == {"answer": 1}
+    assert cache.disk_hits == 1
+
+    # 10 s were left on disk; the memory copy must not live a fresh 100 s
+    wall[0] += 11
+    mono[0] += 11
+    assert cache.get("k") is None
+    disk.close()
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from rate_limiter import RateLimiter, RateLimitExceeded, VirtualClock
+
+
+def test_limits_are_off_by_default():
+    limiter = RateLimiter(per_model={}, clock=VirtualClock())
+
+    async def burst():
+        for _ in range(1000):
+            await limiter.acquire("gpt-4", 1000)
+
+    asyncio.run(burst())
+    assert limiter.queued == 0 and limiter.admitted == 1000
+
+
+def test_request_that_would_wait_too_long_is_rejected_at_once():
+    clock = VirtualClock()
+    limiter = RateLimiter(rpm=0, tpm=6000, per_model={}, clock=clock, wait_limit=15)
+
+    async def scenario():
+        await limiter.acquire("gpt-4", 6000)  # drains the bucket; refills at 100 tokens/s
+        waiting = asyncio.ensure_future(limiter.acquire("gpt-4", 1000))  # ~10 s: queued
+        await asyncio.sleep(0)
+        with pytest.raises(RateLimitExceeded) as rejected:
+            await limiter.acquire("gpt-4", 1000)  # ~20 s behind the queued one
+        await clock.advance(10)
+        await waiting
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.retry_after == pytest.approx(20)
+    assert limiter.rejected == 1 and limiter.admitted == 2
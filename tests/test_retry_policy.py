@@ -0,0 +1,110 @@
+import asyncio
+
+import httpx
+import pytest
+
+from mock_openai_server import MockConfig, create_app
+from rate_limiter import Clock, VirtualClock
+from retry_policy import DeadlineExceeded, RetryBudget, RetryPolicy
+
+PAYLOAD = {"model": "gpt-4", "messages": [{"role": "user", "content": "hi"}]}
+
+
+def fake_server(**faults) -> httpx.AsyncClient:
+    """Client for the local mock OpenAI server with the given faults injected."""
+    app = create_app(MockConfig(latency="fixed:0", tokens_per_second=0, seed=1, **faults))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock")
+
+
+async def drive(clock: VirtualClock, coro):
+    """Run `coro`, jumping virtual time to the next sleeper whenever it is only waiting on the clock."""
+    task = asyncio.ensure_future(coro)
+    while not task.done():
+        if clock._sleepers:
+            await clock.advance(clock._sleepers[0][0] - clock.now())
+        else:
+            await asyncio.sleep(0.001)
+    return task.result()
+
+
+def completion(client: httpx.AsyncClient, clock: Clock, attempts: list):
+    async def call():
+        attempts.append(clock.now())
+        response = await client.post("/v1/chat/completions", json=PAYLOAD)
+        response.raise_for_status()
+        return response.json()
+    return call
+
+
+def test_429_is_retried_after_its_retry_after_delay():
+    async def main():
+        clock = VirtualClock()
+        policy = RetryPolicy(max_attempts=3, base_delay=10, clock=clock)
+        attempts = []
+        async with fake_server(error_rate=1.0, error_statuses="429") as client:
+            with pytest.raises(httpx.HTTPStatusError) as raised:
+                await drive(clock, policy.run(completion(client, clock, attempts)))
+        assert raised.value.response.status_code == 429
+        # The server says retry-after: 1, which overrides the 10 s backoff
+        assert attempts == [0.0, 1.0, 2.0]
+        assert policy.retries == 2
+    asyncio.run(main())
+
+
+def test_429_then_success_returns_the_retried_response():
+    responses = iter([
+        httpx.Response(429, headers={"retry-after": "3"}),
+        httpx.Response(200, json={"id": "ok"}),
+    ])
+    transport = httpx.MockTransport(lambda request: next(responses))
+
+    async def main():
+        clock = VirtualClock()
+        policy = RetryPolicy(clock=clock)
+        attempts = []
+        async with httpx.AsyncClient(transport=transport, base_url="http://mock") as client:
+            result = await drive(clock, policy.run(completion(client, clock, attempts)))
+        assert result == {"id": "ok"}
+        assert attempts == [0.0, 3.0]
+    asyncio.run(main())
+
+
+def test_non_retryable_400_passes_through_without_retry():
+    async def main():
+        clock = VirtualClock()
+        policy = RetryPolicy(clock=clock)
+        attempts = []
+        async with fake_server(error_rate=1.0, error_statuses="400") as client:
+            with pytest.raises(httpx.HTTPStatusError) as raised:
+                await drive(clock, policy.run(completion(client, clock, attempts)))
+        assert raised.value.response.status_code == 400
+        assert len(attempts) == 1
+        assert policy.retries == 0
+    asyncio.run(main())
+
+
+def test_hanging_upstream_raises_deadline_exceeded():
+    async def main():
+        policy = RetryPolicy(deadline=0.2, clock=Clock())
+        attempts = []
+        async with fake_server(hang_rate=1.0, hang_seconds=30) as client:
+            with pytest.raises(DeadlineExceeded):
+                await policy.run(completion(client, policy.clock, attempts))
+        assert len(attempts) == 1
+    asyncio.run(main())
+
+
+def test_exhausted_retry_budget_stops_retries():
+    async def main():
+        clock = VirtualClock()
+        # No steady allowance and no deposits: a single banked retry
+        budget = RetryBudget(ratio=0, min_per_second=0, clock=clock)
+        policy = RetryPolicy(max_attempts=5, base_delay=0.1, budget=budget, clock=clock)
+        attempts = []
+        async with fake_server(error_rate=1.0, error_statuses="503") as client:
+            with pytest.raises(httpx.HTTPStatusError) as raised:
+                await drive(clock, policy.run(completion(client, clock, attempts)))
+        assert raised.value.response.status_code == 503
+        assert len(attempts) == 2
+        assert budget.exhausted == 1
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from models import ChatMessage
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_session_deleted_during_chat_returns_the_reply_with_409(client, monkeypatch):
+    session_id = main.session_store.create()
+
+    async def chat_completion(messages, session_id=None, use_cache=True):
+        main.session_store.delete(session_id)  # DELETE lands while the upstream call is in flight
+        return ChatMessage(role="assistant", content="Three days in Lisbon.")
+
+    monkeypatch.setattr(main, "chat_completion", chat_completion)
+    response = client.post(f"/api/sessions/{session_id}/chat", json={"content": "Plan Lisbon"})
+
+    assert response.status_code == 409
+    assert response.json()["message"]["content"] == "Three days in Lisbon."
+
+
+def test_session_deleted_during_stream_ends_with_an_error_event(client, monkeypatch):
+    session_id = main.session_store.create()
+
+    async def chat_completion_stream(messages, session_id=None):
+        yield "Three days "
+        main.session_store.delete(session_id)
+        yield "in Lisbon."
+
+    monkeypatch.setattr(main, "chat_completion_stream", chat_completion_stream)
+    response = client.post(f"/api/sessions/{session_id}/chat/stream", json={"content": "Plan Lisbon"})
+
+    last = response.text.strip().split("\n\n")[-1].split("\n")
+    assert last[0] == "event: error"
+    assert json.loads(last[1][len("data:"):])["message"]["content"] == "Three days in Lisbon."
@@ -0,0 +1,25 @@
+from transcriber import _stitch
+
+
+def test_stitch_keeps_a_phrase_repeated_before_the_boundary():
+    assert _stitch(["it is what it is", "it is a test"], [False, True]) == "it is what it is a test"
+
+
+def test_stitch_drops_a_half_heard_word_at_the_end_of_the_previous_window():
+    texts = ["I am going to the sta", "to the station at noon. Then"]
+    assert _stitch(texts, [False, True]) == "I am going to the station at noon. Then"
+
+
+def test_stitch_drops_a_half_heard_word_at_the_start_of_the_next_window():
+    texts = ["I am going to the station", "ion to the station at noon. Then"]
+    assert _stitch(texts, [False, True]) == "I am going to the station at noon. Then"
+
+
+def test_stitch_ignores_case_and_punctuation_in_the_overlap():
+    texts = ["We left at noon. Then", "noon, then we ate"]
+    assert _stitch(texts, [False, True]) == "We left at noon. Then we ate"
+
+
+def test_stitch_joins_windows_that_do_not_overlap():
+    assert _stitch(["it is", "it is"], [False, False]) == "it is it is"
+    assert _stitch(["one two three", "four five"], [False, True]) == "one two three four five"
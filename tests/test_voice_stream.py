@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from streaming_asr import StreamingTranscription, StreamTooLong
+from transcriber import SAMPLE_RATE
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def transcribe_samples(audio, language=None, prompt=None):
+        return "hello"
+
+    # A loaded transcriber without a model; the VAD keeps the test tone, Whisper is stubbed
+    monkeypatch.setattr(main.transcriber, "_executor", object())
+    monkeypatch.setattr(main.transcriber, "transcribe_samples", transcribe_samples)
+    return TestClient(main.app)
+
+
+def tone(seconds: float) -> bytes:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 220 * t) * 8000).astype("<i2").tobytes()
+
+
+@pytest.mark.parametrize("sample_rate", [0, 1, 7999, 48001])
+def test_sample_rate_outside_the_supported_range_is_rejected(client, sample_rate):
+    with client.websocket_connect(f"/ws/voice?sample_rate={sample_rate}") as ws:
+        assert ws.receive_json()["type"] == "error"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1003
+
+
+def test_odd_length_frame_is_rejected(client):
+    with client.websocket_connect("/ws/voice") as ws:
+        ws.send_bytes(tone(0.5) + b"\x00")
+        assert ws.receive_json()["type"] == "error"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1003
+
+
+def test_stream_length_is_checked_before_resampling():
+    stream = StreamingTranscription(8000, max_seconds=1)
+    with pytest.raises(StreamTooLong):
+        stream.feed(b"\x00\x00" * 8001)  # just over 1 s at 8 kHz
+    assert stream.seconds == 0
+
+
+def test_malformed_control_frames_are_ignored(client):
+    with client.websocket_connect("/ws/voice") as ws:
+        ws.send_bytes(tone(0.5))
+        for frame in ("not json", "[1, 2]", '"stop"', '{"type": "pause"}'):
+            ws.send_text(frame)
+        ws.send_text('{"type": "stop"}')
+        message = ws.receive_json()
+        while message["type"] == "partial":
+            message = ws.receive_json()
+    assert message == {"type": "final", "text": "hello"}
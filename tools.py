@@ -1,7 +1,9 @@
 from crewai.tools import tool
 from serpapi import GoogleSearch
+from tracing import span
 
 @tool("Flight Search Tool")
+@span("tool.flight_search")
 def flight_search_tool(query:str, departure_id, arrival_id, outbound_date, return_date):
     """Search flight given the query."""
     params = {
@@ -29,6 +31,7 @@ def flight_search_tool(query:str, departure_id, arrival_id, outbound_date, retur
     return flight_details
 
 @tool("Hotel Search Tool")
+@span("tool.hotel_search")
 def hotel_search_tool(query: str, check_in_date: str,
                     check_out_date: str, adults:str) -> list:
     """Search hotels given the query, check_in_date, check_out_date, adults."""
@@ -0,0 +1,353 @@
+"""
+Lightweight in-process tracing: spans with contextvars-propagated trace
+ids, exported as JSON lines to a rotating file (TRACE_FILE; unset means
+spans are not exported). No collector needed.
+
+    with span("orchestrate_trip", chars=len(text)):
+        ...
+
+    @span("get_trip_plan")
+    async def get_trip_plan(...): ...
+
+Per-stage latency breakdown from the exported spans:
+
+    python tracing.py [file]                # all stages, slowest self-time first (default: TRACE_FILE)
+    python tracing.py --trace <trace_id>    # one request as a tree
+    python tracing.py --slowest 5 --root "POST /api/trip/create"
+"""
+
+import argparse
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Spans are exported only when TRACE_FILE is set, so running the app or a script never writes into the checkout
+TRACE_FILE = os.getenv("TRACE_FILE") or None
+TRACING_ENABLED = TRACE_FILE is not None and os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "5"))
+# With several workers, give each process its own file; RotatingFileHandler isn't safe across processes
+TRACE_FILE_PER_PROCESS = os.getenv("TRACE_FILE_PER_PROCESS", "false").lower() in ("1", "true", "yes")
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_export_logger = logging.getLogger("tracing.spans")
+_export_logger.propagate = False
+_listener: Optional[QueueListener] = None
+
+
+def _new_id(bits: int) -> str:
+    return format(random.getrandbits(bits), f"0{bits // 4}x")
+
+
+def _configure_export(path: str = TRACE_FILE):
+    """Spans are queued and written by a background thread, so the event loop never does file I/O."""
+    global _listener
+    if _listener is not None:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if TRACE_FILE_PER_PROCESS:
+        path = f"{path}.{os.getpid()}"
+    handler = RotatingFileHandler(path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _export_logger.addHandler(QueueHandler(records))
+    _export_logger.setLevel(logging.INFO)
+    _listener = QueueListener(records, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attrs", "start", "_t0", "duration", "error", "_token")
+
+    def __init__(self, name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None, **attrs):
+        parent = _current.get()
+        self.name = name
+        self.trace_id = trace_id or (parent.trace_id if parent else _new_id(128))
+        self.parent_id = parent_id or (parent.span_id if parent and not trace_id else None)
+        self.span_id = _new_id(64)
+        self.attrs = attrs
+        self.error = None
+        self.duration = None
+        self._token = None
+
+    def set(self, key: str, value):
+        self.attrs[key] = value
+
+    def __enter__(self):
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._t0
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # An async generator closed from another context (e.g. by the loop's finalizer)
+            pass
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}" if str(exc) else exc_type.__name__
+        if TRACING_ENABLED:
+            if _listener is None:
+                _configure_export()
+            _export_logger.info(json.dumps(self.as_dict(), default=str))
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+class span:
+    """
+    Context manager (sync or async) and decorator for sync functions,
+    coroutines and async generators. A generator's span covers its whole
+    iteration, which is what a streamed response costs.
+    """
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self._span: Optional[Span] = None
+
+    def __enter__(self) -> Span:
+        self._span = Span(self.name, **self.attrs)
+        return self._span.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._span.__exit__(exc_type, exc, tb)
+
+    async def __aenter__(self) -> Span:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def __call__(self, fn):
+        name, attrs = self.name, self.attrs
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def agen_wrapper(*args, **kwargs):
+                with Span(name, **attrs):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+            return agen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with Span(name, **attrs):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Span(name, **attrs):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current.get()
+    return current.trace_id if current else None
+
+
+class TracingMiddleware:
+    """
+    Opens the root span for each HTTP request, continuing an incoming W3C
+    `traceparent` if there is one, and returns the trace id as X-Trace-Id.
+    Root time not covered by child spans is request parsing, validation
+    and response serialization.
+    """
+
+    def __init__(self, app, skip_paths=("/health", "/metrics")):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = parent_id = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                match = _TRACEPARENT_RE.match(value.decode("latin-1").strip())
+                if match:
+                    trace_id, parent_id = match.groups()
+                break
+
+        root = Span("http", trace_id=trace_id, parent_id=parent_id, method=scope["method"], path=scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("status", message["status"])
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", root.trace_id.encode())]
+            await send(message)
+
+        with root:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                root.name = f"{scope['method']} {route or scope['path']}"
+
+
+# CLI: per-stage breakdown of exported spans
+
+def _read_spans(path: str) -> List[dict]:
+    files = [f"{path}.{i}" for i in range(TRACE_BACKUP_COUNT, 0, -1)] + [path]
+    directory = os.path.dirname(path) or "."
+    base = os.path.basename(path)
+    if os.path.isdir(directory):
+        # Per-process files (TRACE_FILE_PER_PROCESS) and their backups
+        files += sorted(
+            os.path.join(directory, f) for f in os.listdir(directory)
+            if f.startswith(base + ".") and os.path.join(directory, f) not in files
+        )
+    spans = []
+    for file in files:
+        if not os.path.exists(file):
+            continue
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue
+    return spans
+
+
+def _self_times(spans: List[dict]) -> Dict[str, float]:
+    """Span duration minus time spent in direct children (children may overlap when concurrent)."""
+    child_time: Dict[str, float] = defaultdict(float)
+    for s in spans:
+        if s["parent_id"]:
+            child_time[s["parent_id"]] += s["duration_ms"]
+    return {s["span_id"]: max(0.0, s["duration_ms"] - child_time[s["span_id"]]) for s in spans}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def print_breakdown(spans: List[dict]):
+    self_times = _self_times(spans)
+    stages: Dict[str, List[dict]] = defaultdict(list)
+    for s in spans:
+        stages[s["name"]].append(s)
+    rows = []
+    for name, items in stages.items():
+        totals = [s["duration_ms"] for s in items]
+        selfs = [self_times[s["span_id"]] for s in items]
+        errors = sum(1 for s in items if s["status"] == "error")
+        rows.append((name, len(items), sum(totals) / len(totals), _percentile(totals, 0.5),
+                     _percentile(totals, 0.95), sum(selfs) / len(selfs), sum(selfs), errors))
+    rows.sort(key=lambda r: r[6], reverse=True)
+    print(f"{'stage':<42}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'self ms':>10}{'self %':>8}{'err':>6}")
+    grand_self = sum(r[6] for r in rows) or 1.0
+    for name, count, mean, p50, p95, mean_self, total_self, errors in rows:
+        print(f"{name[:41]:<42}{count:>7}{mean:>10.1f}{p50:>10.1f}{p95:>10.1f}{mean_self:>10.1f}"
+              f"{total_self / grand_self:>8.1%}{errors:>6}")
+
+
+def print_trace(spans: List[dict], trace_id: str):
+    spans = [s for s in spans if s["trace_id"] == trace_id]
+    if not spans:
+        print(f"no spans for trace {trace_id}")
+        return
+    ids = {s["span_id"] for s in spans}
+    children: Dict[Optional[str], List[dict]] = defaultdict(list)
+    for s in spans:
+        children[s["parent_id"] if s["parent_id"] in ids else None].append(s)
+    t0 = min(s["start"] for s in spans)
+    self_times = _self_times(spans)
+
+    def walk(parent, depth):
+        for s in sorted(children[parent], key=lambda s: s["start"]):
+            offset = (s["start"] - t0) * 1000
+            flag = f"  ! {s['error']}" if s["error"] else ""
+            print(f"{offset:>9.1f} ms  {'  ' * depth}{s['name']}  {s['duration_ms']:.1f} ms "
+                  f"(self {self_times[s['span_id']]:.1f}){flag}")
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", nargs="?", default=TRACE_FILE)
+    parser.add_argument("--trace", help="print one trace as a tree")
+    parser.add_argument("--root", help="only traces whose root span has this name, e.g. 'POST /api/chat'")
+    parser.add_argument("--slowest", type=int, help="print the N slowest matching traces as trees")
+    args = parser.parse_args()
+    if args.file is None:
+        parser.error("no trace file given and TRACE_FILE is not set")
+
+    spans = _read_spans(args.file)
+    if not spans:
+        sys.exit(f"no spans found in {args.file}")
+    if args.trace:
+        print_trace(spans, args.trace)
+        return
+
+    # Roots include spans continuing an upstream traceparent, whose parent isn't in our files
+    ids = {s["span_id"] for s in spans}
+    roots = [s for s in spans if s["parent_id"] not in ids]
+    if args.root:
+        roots = [s for s in roots if s["name"] == args.root]
+        keep = {s["trace_id"] for s in roots}
+        spans = [s for s in spans if s["trace_id"] in keep]
+    print(f"{len(spans)} spans in {len({s['trace_id'] for s in spans})} traces\n")
+    print_breakdown(spans)
+    if args.slowest:
+        for root in sorted(roots, key=lambda s: s["duration_ms"], reverse=True)[:args.slowest]:
+            print(f"\ntrace {root['trace_id']}")
+            print_trace(spans, root["trace_id"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,598 @@
+# transcriber.py
+
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import subprocess
+import threading
+import types
+import warnings
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from multiprocessing import shared_memory
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+from batch_scheduler import WHISPER_BATCH_SIZE, WHISPER_BATCH_WAIT_MS, BatchScheduler
+from metrics import (
+    TRANSCRIPTION_AUDIO_SECONDS, TRANSCRIPTION_BATCH_SIZE, TRANSCRIPTION_QUEUE_DEPTH, TRANSCRIPTION_REJECTED, record_cache,
+)
+from tracing import span
+from transcript_cache import TRANSCRIPT_CACHE_ENABLED, audio_digest, transcript_cache, transcript_key
+from vad import VAD_MAX_CHUNK_SECONDS, speech_chunks, speech_windows
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+try:
+    import whisper
+except ImportError:  # optional: voice input is unavailable without it
+    whisper = None
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cpu")
+# "fp32", or "int8": Linear layers dynamically quantized to int8 (CPU only)
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "fp32").lower()
+# torch intra-op threads for inference; 0 keeps torch's default (all cores)
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))
+# Language hint (e.g. "en", "de"); empty means auto-detect on every request
+WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE") or None
+WHISPER_DOWNLOAD_ROOT = os.getenv("WHISPER_DOWNLOAD_ROOT") or None
+# Worker processes, each with its own warm model; 0 runs inference on a thread in this process
+WHISPER_POOL_SIZE = int(os.getenv("WHISPER_POOL_SIZE", "0"))
+# Clips admitted (running + waiting) before new ones get 503; 0 means 4 per inference slot,
+# or two batches' worth per slot when batching
+WHISPER_QUEUE_LIMIT = int(os.getenv("WHISPER_QUEUE_LIMIT", "0"))
+# Transcribe a long clip's windows concurrently (pool workers or one batch) instead of one after another
+WHISPER_PARALLEL_CHUNKS = os.getenv("WHISPER_PARALLEL_CHUNKS", "true").lower() in ("1", "true", "yes")
+# Audio shared by adjacent windows when a clip has to be split mid-speech
+WHISPER_CHUNK_OVERLAP = float(os.getenv("WHISPER_CHUNK_OVERLAP", "1.5"))
+
+SAMPLE_RATE = 16000
+# Whisper's context; longer clips can't go into a batch and use the sequential path
+BATCH_MAX_SAMPLES = 30 * SAMPLE_RATE
+
+# whisper.transcribe()'s defaults for rejecting a greedy decode
+_NO_SPEECH_THRESHOLD = 0.6
+_LOGPROB_THRESHOLD = -1.0
+_COMPRESSION_RATIO_THRESHOLD = 2.4
+
+# Encoded audio: in-memory bytes, or a real file (e.g. a spooled upload) that ffmpeg reads directly
+AudioSource = Union[bytes, bytearray, memoryview, BinaryIO]
+
+
+class AudioDecodeError(ValueError):
+    pass
+
+
+class TranscriberUnavailable(RuntimeError):
+    pass
+
+
+class TranscriberBusy(Exception):
+    """The transcription queue is full; `retry_after` estimates when a slot frees up."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"transcription queue is full; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def source_size(source: AudioSource) -> int:
+    if hasattr(source, "fileno"):
+        return os.fstat(source.fileno()).st_size
+    return len(source)
+
+
+def decode_audio(source: AudioSource, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode any container/codec ffmpeg understands to mono float32 PCM,
+    piping through stdin/stdout instead of a temporary file. A file
+    object is handed to ffmpeg as its stdin, so it is never read into
+    this process at all.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0",
+        "-i", "pipe:0", "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "pipe:1",
+    ]
+    if hasattr(source, "fileno"):
+        source.seek(0)
+        stdin = {"stdin": source}
+    else:
+        stdin = {"input": source}
+    try:
+        proc = subprocess.run(cmd, capture_output=True, check=True, **stdin)
+    except FileNotFoundError as exc:
+        raise TranscriberUnavailable("ffmpeg is required to decode audio") from exc
+    except subprocess.CalledProcessError as exc:
+        raise AudioDecodeError(exc.stderr.decode(errors="replace").strip() or "could not decode audio") from exc
+    if not proc.stdout:
+        raise AudioDecodeError("audio contains no samples")
+    return np.frombuffer(proc.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def _prompt(texts: List[str]) -> Optional[str]:
+    # The previous chunk's text keeps spelling and names consistent across a split
+    return texts[-1][-200:] if texts and texts[-1] else None
+
+
+def _join(texts: List[str]) -> str:
+    return " ".join(t for t in texts if t)
+
+
+_STITCH_WORDS = 12  # words at each side of a boundary searched for the overlap
+
+
+def _normalized(words: List[str]) -> List[str]:
+    return ["".join(c for c in word.lower() if c.isalnum()) for word in words]
+
+
+def _overlap(a: List[str], b: List[str]) -> Optional[Tuple[int, int, int]]:
+    """
+    Longest run of at least two words that ends `a` and starts `b`, allowing
+    one cut-off word after it in `a` and one before it in `b`. Returns
+    (words of `a` to drop, words of `b` to drop, run length), or None.
+    """
+    for size in range(min(len(a), len(b)), 1, -1):
+        for cut_a, cut_b in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            end = len(a) - cut_a
+            if end >= size and a[end - size:end] == b[cut_b:cut_b + size]:
+                return cut_a, cut_b, size
+    return None
+
+
+def _stitch(texts: List[str], overlaps: List[bool]) -> str:
+    """
+    Join window transcripts, dropping the words an overlapping window
+    repeats from the previous one. Only a run that ends the previous text
+    and starts the next counts as the overlap, so a phrase repeated earlier
+    in the previous window is kept; words cut off at either edge of the
+    overlap (often a half-heard word) are dropped with it.
+    """
+    words: List[str] = []
+    for text, overlapped in zip(texts, overlaps):
+        new = text.split()
+        if overlapped and words and new:
+            tail = max(0, len(words) - _STITCH_WORDS)
+            match = _overlap(_normalized(words[tail:]), _normalized(new[:_STITCH_WORDS]))
+            if match is not None:
+                cut_a, cut_b, size = match
+                words = words[:len(words) - cut_a]
+                new = new[cut_b + size:]
+        words += new
+    return " ".join(words)
+
+
+BACKENDS = ("fp32", "int8")
+
+
+def _decoder_forward_int8(self, x, xa, kv_cache=None):
+    # whisper's TextDecoder.forward, with the tied output projection done by the quantized `logits` layer
+    offset = next(iter(kv_cache.values())).shape[1] if kv_cache else 0
+    x = self.token_embedding(x) + self.positional_embedding[offset:offset + x.shape[-1]]
+    x = x.to(xa.dtype)
+    for block in self.blocks:
+        x = block(x, xa, mask=self.mask, kv_cache=kv_cache)
+    return self.logits(self.ln(x)).float()
+
+
+def quantize_int8(model):
+    """
+    Dynamic int8 quantization of every Linear layer (attention projections
+    and MLPs) and of the decoder's vocabulary projection, which at ~50k
+    outputs costs each decoding step more than all decoder blocks together.
+    Weights are stored as int8 per output channel and activations are
+    quantized on the fly; the convolutional front end stays in fp32.
+    """
+    import torch
+    from torch.ao.quantization import per_channel_dynamic_qconfig, quantize_dynamic
+    # Whisper's Linear subclass casts its weights in forward(); quantize_dynamic only swaps plain nn.Linear
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                plain = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                plain.weight, plain.bias = child.weight, child.bias
+                setattr(module, name, plain)
+    decoder = model.decoder
+    n_vocab, n_state = decoder.token_embedding.weight.shape
+    decoder.logits = torch.nn.Linear(n_state, n_vocab, bias=False)
+    decoder.logits.weight = decoder.token_embedding.weight
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # torch.ao.quantization's deprecation notice
+        quantize_dynamic(model, {torch.nn.Linear: per_channel_dynamic_qconfig}, dtype=torch.qint8, inplace=True)
+    decoder.forward = types.MethodType(_decoder_forward_int8, decoder)
+    return model
+
+
+# Pool worker side: each process loads the model once in its initializer
+
+_worker: Optional["Transcriber"] = None
+
+
+def _init_worker(model_name: str, device: str, threads: int, language: Optional[str], backend: str):
+    global _worker
+    _worker = Transcriber(model_name, device, threads, language, pool_size=0, batch_size=0, backend=backend)
+    _worker.load()
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def _worker_transcribe(shm_name: str, samples: int, language: Optional[str], prompt: Optional[str]) -> str:
+    # Parent and workers share one resource tracker (spawn), so attaching needs no unregister
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        audio = np.ndarray((samples,), dtype=np.float32, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+    return _worker.transcribe_pcm(audio, language, prompt)
+
+
+def _worker_transcribe_batch(shm_name: str, lengths: List[int], language: Optional[str], prompt: Optional[str],
+                             fallback: bool) -> List[str]:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        audio = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+    return _worker.transcribe_batch(np.split(audio, np.cumsum(lengths)[:-1]), language, prompt, fallback)
+
+
+@contextmanager
+def _shared_pcm(audio: np.ndarray):
+    """Copy PCM into a shared memory block for a pool worker; yields the block's name."""
+    shm = shared_memory.SharedMemory(create=True, size=max(1, audio.nbytes))
+    try:
+        np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+        yield shm.name
+    finally:
+        # Unlinking only removes the name; a worker still reading keeps its mapping
+        shm.close()
+        shm.unlink()
+
+
+class Transcriber:
+    """
+    Whisper inference behind a bounded queue.
+
+    With pool_size=0 one model is shared in-process and runs on a single
+    dedicated thread: Whisper installs KV-cache hooks on the model while
+    decoding, so concurrent calls on one model would interfere, and torch
+    already parallelises each call across WHISPER_THREADS cores.
+
+    With pool_size=N, N worker processes each keep a warm model, so clips
+    are transcribed in parallel without contending for this process's GIL.
+    PCM is handed over through shared memory rather than pickled through
+    the pool's pipe.
+
+    With batch_size=N (N > 0), clips of up to 30 s that arrive within
+    batch_wait_ms of each other are stacked into one forward pass of up
+    to N clips. Clips are batched only with others that share their
+    language and prompt, because Whisper decodes a batch with one set of
+    options. Batching is off by default (WHISPER_BATCH_SIZE=0).
+
+    backend="int8" runs a dynamically quantized copy of the model on CPU;
+    everything else (pool, batching, windows) works the same.
+    """
+
+    def __init__(self, model_name: str = WHISPER_MODEL, device: str = WHISPER_DEVICE,
+                 threads: int = WHISPER_THREADS, language: Optional[str] = WHISPER_LANGUAGE,
+                 pool_size: int = WHISPER_POOL_SIZE, queue_limit: int = WHISPER_QUEUE_LIMIT,
+                 batch_size: int = WHISPER_BATCH_SIZE, batch_wait_ms: float = WHISPER_BATCH_WAIT_MS,
+                 backend: str = WHISPER_BACKEND):
+        self.model_name = model_name
+        self.device = device
+        self.backend = backend
+        self.threads = threads
+        self.language = language
+        self.pool_size = pool_size
+        # Batching needs room for a full batch running and the next one filling on every slot
+        per_slot = 2 * batch_size if batch_size > 0 else 4
+        self.queue_limit = queue_limit or per_slot * max(1, pool_size)
+        self.model = None
+        self._lock = threading.Lock()  # guards loading and serialises in-process inference
+        self._executor: Optional[Executor] = None
+        self.pending = 0
+        self.rejected = 0
+        self._mean_seconds = 0.0  # moving average of inference time, for Retry-After
+        self.batch_fallback = True
+        self._batcher: Optional[BatchScheduler] = None
+        if batch_size > 0:
+            self._batcher = BatchScheduler(self._run_batch, batch_size, batch_wait_ms / 1000,
+                                           concurrency=max(1, pool_size))
+
+    @property
+    def ready(self) -> bool:
+        return self._executor is not None
+
+    @property
+    def model_id(self) -> str:
+        """Model name plus backend when it isn't fp32; quantized output can differ, so it's cached apart."""
+        return self.model_name if self.backend == "fp32" else f"{self.model_name}-{self.backend}"
+
+    @property
+    def parallel(self) -> bool:
+        """
+        Whether a long clip's windows are transcribed all at once (across pool
+        workers, or stacked into batches) rather than one after another. The
+        windows then can't be prompted with the text before them, so they
+        overlap where a split falls inside speech and are stitched afterwards.
+        """
+        return WHISPER_PARALLEL_CHUNKS and (self.pool_size > 1 or self._batcher is not None)
+
+    def load(self):
+        """Load the model (or start and warm the pool) if not done yet; safe to call repeatedly."""
+        with self._lock:
+            if self._executor is not None:
+                return
+            if whisper is None:
+                raise TranscriberUnavailable("openai-whisper is not installed")
+            if self.backend not in BACKENDS:
+                raise TranscriberUnavailable(f"unknown Whisper backend {self.backend!r}; expected one of {BACKENDS}")
+            if self.backend == "int8" and self.device != "cpu":
+                raise TranscriberUnavailable("the int8 Whisper backend runs on CPU only")
+            if self.pool_size > 0:
+                self._start_pool()
+                return
+            if self.threads > 0:
+                import torch
+                torch.set_num_threads(self.threads)
+            logger.info("Loading Whisper model %s (%s) on %s", self.model_name, self.backend, self.device)
+            model = whisper.load_model(self.model_name, device=self.device, download_root=WHISPER_DOWNLOAD_ROOT)
+            self.model = quantize_int8(model) if self.backend == "int8" else model
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+
+    def _start_pool(self):
+        # Split the cores between workers instead of letting every worker's torch use all of them
+        threads = self.threads or max(1, (os.cpu_count() or 1) // self.pool_size)
+        logger.info("Starting %d Whisper workers (%s, %d threads each)", self.pool_size, self.model_id, threads)
+        pool = ProcessPoolExecutor(
+            max_workers=self.pool_size,
+            # spawn: forking a process that already runs torch threads and an event loop is unsafe
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_name, self.device, threads, self.language, self.backend),
+        )
+        try:
+            # Concurrent submits start every worker, so all models are loaded before we take traffic
+            pids = {f.result() for f in [pool.submit(_worker_pid) for _ in range(self.pool_size)]}
+        except Exception:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        logger.info("Whisper workers ready: %s", sorted(pids))
+        self._executor = pool
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self.model = None
+
+    def transcribe_pcm(self, audio: np.ndarray, language: Optional[str] = None, prompt: Optional[str] = None) -> str:
+        """Blocking in-process inference on 16 kHz mono float32 PCM; `prompt` is preceding text."""
+        with self._lock:
+            result = self.model.transcribe(
+                audio,
+                language=language or self.language,
+                fp16=self.device != "cpu",
+                condition_on_previous_text=False,
+                initial_prompt=prompt,
+            )
+        return result["text"].strip()
+
+    def transcribe_batch(self, audios: List[np.ndarray], language: Optional[str] = None,
+                         prompt: Optional[str] = None, fallback: bool = True) -> List[str]:
+        """
+        Blocking in-process inference on clips of at most 30 s in one forward
+        pass: log-mel spectrograms are padded to the 30 s window, stacked and
+        greedily decoded together. A clip whose decode transcribe() would have
+        rejected (repetitive or low confidence) is redone on its own with
+        transcribe()'s temperature fallback, unless `fallback` is off.
+        """
+        import torch
+        with self._lock:
+            mel = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.model.dims.n_mels) for audio in audios
+            ]).to(self.model.device)
+            options = whisper.DecodingOptions(
+                language=language or self.language, prompt=prompt, fp16=self.device != "cpu", without_timestamps=True,
+            )
+            results = whisper.decode(self.model, mel, options)
+        texts = []
+        for audio, result in zip(audios, results):
+            if result.no_speech_prob > _NO_SPEECH_THRESHOLD and result.avg_logprob < _LOGPROB_THRESHOLD:
+                texts.append("")
+            elif fallback and (result.compression_ratio > _COMPRESSION_RATIO_THRESHOLD
+                               or result.avg_logprob < _LOGPROB_THRESHOLD):
+                texts.append(self.transcribe_pcm(audio, language, prompt))
+            else:
+                texts.append(result.text.strip())
+        return texts
+
+    def transcribe_file(self, path: str, language: Optional[str] = None) -> str:
+        """Blocking convenience wrapper for scripts (loads the model on first use)."""
+        with open(path, "rb") as f:
+            key = self._cache_key(f, language)
+            cached = self._cached(key)
+            if cached is not None:
+                return cached
+            self.load()
+            audio = decode_audio(f)
+        windows = self._speech(audio, self.parallel)
+        if self.parallel:
+            texts = self._transcribe_windows([chunk for chunk, _ in windows], language)
+            return self._remember(key, _stitch(texts, [overlapped for _, overlapped in windows]))
+        texts = []
+        for chunk, _ in windows:
+            if self.pool_size <= 0:
+                texts.append(self.transcribe_pcm(chunk, language, _prompt(texts)))
+            else:
+                with _shared_pcm(chunk) as name:
+                    future = self._executor.submit(_worker_transcribe, name, len(chunk), language, _prompt(texts))
+                    texts.append(future.result())
+        return self._remember(key, _join(texts))
+
+    def _transcribe_windows(self, chunks: List[np.ndarray], language: Optional[str]) -> List[str]:
+        """Blocking: every window at once, one per pool worker, or stacked into batches in a single slot."""
+        if self.pool_size > 1:
+            with ExitStack() as stack:
+                futures = [
+                    self._executor.submit(_worker_transcribe, stack.enter_context(_shared_pcm(c)), len(c), language, None)
+                    for c in chunks
+                ]
+                return [f.result() for f in futures]
+        texts = []
+        size = self._batcher.max_size
+        for i in range(0, len(chunks), size):
+            group = chunks[i:i + size]
+            if self.pool_size <= 0:
+                texts += self.transcribe_batch(group, language, None, self.batch_fallback)
+            else:
+                with _shared_pcm(np.concatenate(group)) as name:
+                    texts += self._executor.submit(
+                        _worker_transcribe_batch, name, [len(c) for c in group], language, None, self.batch_fallback
+                    ).result()
+        return texts
+
+    def retry_after(self) -> float:
+        """Rough time until a queued clip would start: queue length x mean inference time / workers."""
+        slots = max(1, self.pool_size)
+        if self._batcher is not None and self._batcher.batches:
+            # _mean_seconds is per batch, and each batch takes several clips off the queue
+            slots *= self._batcher.mean_batch_size
+        return max(1.0, math.ceil(self.pending * (self._mean_seconds or 1.0) / slots))
+
+    @contextmanager
+    def _slot(self):
+        """Admit one clip into the bounded queue, or fail fast."""
+        if not self.ready:
+            raise TranscriberUnavailable("Whisper model is not loaded")
+        if self.pending >= self.queue_limit:
+            self.rejected += 1
+            TRANSCRIPTION_REJECTED.inc()
+            raise TranscriberBusy(self.retry_after())
+        self.pending += 1
+        TRANSCRIPTION_QUEUE_DEPTH.inc()
+        try:
+            yield
+        finally:
+            self.pending -= 1
+            TRANSCRIPTION_QUEUE_DEPTH.dec()
+
+    async def transcribe(self, data: AudioSource, language: Optional[str] = None) -> str:
+        """Decode and transcribe encoded audio without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        # Repeated clips (retries, the same file again) are answered before taking a queue slot
+        key = await loop.run_in_executor(None, self._cache_key, data, language)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        with self._slot():
+            # to_thread, not run_in_executor: it carries the trace context into the thread for the spans
+            windows = await asyncio.to_thread(self._decode_speech, data, self.parallel)
+            if self.parallel:
+                # With several workers each window goes straight to one; batching would pile them onto a single worker
+                texts = await asyncio.gather(
+                    *(self._infer(chunk, language, None, batch=self.pool_size <= 1) for chunk, _ in windows)
+                )
+                return self._remember(key, _stitch(texts, [overlapped for _, overlapped in windows]))
+            texts = []
+            for chunk, _ in windows:
+                texts.append(await self._infer(chunk, language, _prompt(texts)))
+        return self._remember(key, _join(texts))
+
+    async def transcribe_samples(self, audio: np.ndarray, language: Optional[str] = None,
+                                 prompt: Optional[str] = None) -> str:
+        """Transcribe already-decoded 16 kHz float32 PCM as is (callers trim silence themselves)."""
+        with self._slot():
+            return await self._infer(audio, language, prompt)
+
+    def _cache_key(self, source: AudioSource, language: Optional[str]) -> Optional[str]:
+        if not TRANSCRIPT_CACHE_ENABLED:
+            return None
+        return transcript_key(audio_digest(source), self.model_id, language or self.language)
+
+    def _cached(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        text = transcript_cache.get(key)
+        record_cache("transcript", text is not None)
+        return text
+
+    def _remember(self, key: Optional[str], text: str) -> str:
+        if key is not None:
+            transcript_cache.set(key, text)
+        return text
+
+    def _decode_speech(self, data: AudioSource, parallel: bool) -> List[Tuple[np.ndarray, bool]]:
+        """Decode then VAD on one worker thread; both grow with clip length, so neither belongs on the event loop."""
+        with span("whisper.decode", bytes=source_size(data)):
+            # ffmpeg runs as a subprocess, so this thread mostly just waits on it
+            audio = decode_audio(data)
+        return self._speech(audio, parallel)
+
+    def _speech(self, audio: np.ndarray, parallel: bool = False) -> List[Tuple[np.ndarray, bool]]:
+        """
+        Silence trimmed by the VAD, split into chunks at pauses, each with
+        whether it overlaps the previous one; [] if nobody spoke. Windows for
+        parallel transcription are capped at Whisper's 30 s so they can batch.
+        """
+        with span("vad", seconds=round(len(audio) / SAMPLE_RATE, 2)) as current:
+            if parallel:
+                max_seconds = min(VAD_MAX_CHUNK_SECONDS, BATCH_MAX_SAMPLES / SAMPLE_RATE)
+                chunks = speech_windows(audio, max_seconds=max_seconds, overlap=WHISPER_CHUNK_OVERLAP)
+            else:
+                chunks = [(chunk, False) for chunk in speech_chunks(audio)]
+            speech = sum(len(c) for c, _ in chunks) / SAMPLE_RATE
+            current.set("speech_seconds", round(speech, 2))
+        TRANSCRIPTION_AUDIO_SECONDS.labels("received").inc(len(audio) / SAMPLE_RATE)
+        TRANSCRIPTION_AUDIO_SECONDS.labels("transcribed").inc(speech)
+        return chunks
+
+    async def _infer(self, audio: np.ndarray, language: Optional[str], prompt: Optional[str],
+                     batch: bool = True) -> str:
+        if batch and self._batcher is not None and len(audio) <= BATCH_MAX_SAMPLES:
+            with span("whisper.transcribe", model=self.model_id, seconds=round(len(audio) / SAMPLE_RATE, 2),
+                      batched=True):
+                return await self._batcher.submit((language, prompt), audio)
+        loop = asyncio.get_running_loop()
+        with span("whisper.transcribe", model=self.model_id, seconds=round(len(audio) / SAMPLE_RATE, 2)):
+            started = loop.time()
+            if self.pool_size <= 0:
+                text = await loop.run_in_executor(self._executor, self.transcribe_pcm, audio, language, prompt)
+            else:
+                with _shared_pcm(audio) as name:
+                    text = await loop.run_in_executor(
+                        self._executor, _worker_transcribe, name, len(audio), language, prompt
+                    )
+        self._record_time(loop.time() - started)
+        return text
+
+    async def _run_batch(self, key: tuple, audios: List[np.ndarray]) -> List[str]:
+        language, prompt = key
+        loop = asyncio.get_running_loop()
+        TRANSCRIPTION_BATCH_SIZE.observe(len(audios))
+        started = loop.time()
+        if self.pool_size <= 0:
+            texts = await loop.run_in_executor(
+                self._executor, self.transcribe_batch, audios, language, prompt, self.batch_fallback
+            )
+        else:
+            with _shared_pcm(np.concatenate(audios)) as name:
+                texts = await loop.run_in_executor(
+                    self._executor, _worker_transcribe_batch, name, [len(a) for a in audios], language, prompt,
+                    self.batch_fallback,
+                )
+        self._record_time(loop.time() - started)
+        return texts
+
+    def _record_time(self, elapsed: float):
+        self._mean_seconds = 0.8 * self._mean_seconds + 0.2 * elapsed if self._mean_seconds else elapsed
+
+
+transcriber = Transcriber()
@@ -0,0 +1,44 @@
+# transcript_cache.py
+
+import hashlib
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from llm_cache import ResponseCache, SQLiteCacheTier
+
+load_dotenv()
+
+TRANSCRIPT_CACHE_ENABLED = os.getenv("TRANSCRIPT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "512"))
+# The same bytes always decode to the same text, so entries can live long
+TRANSCRIPT_CACHE_TTL = float(os.getenv("TRANSCRIPT_CACHE_TTL", str(7 * 24 * 3600)))
+TRANSCRIPT_CACHE_DB_PATH = os.getenv("TRANSCRIPT_CACHE_DB_PATH")  # unset = memory only
+
+_READ_BLOCK = 1024 * 1024
+
+
+def audio_digest(source) -> str:
+    """SHA-256 of encoded audio: bytes-like, or a file object read in blocks and rewound."""
+    digest = hashlib.sha256()
+    if hasattr(source, "fileno"):
+        source.seek(0)
+        for block in iter(lambda: source.read(_READ_BLOCK), b""):
+            digest.update(block)
+        source.seek(0)
+    else:
+        digest.update(source)
+    return digest.hexdigest()
+
+
+def transcript_key(digest: str, model: str, language: Optional[str]) -> str:
+    # Auto-detect and an explicit language can disagree, so they are separate entries
+    return f"{model}:{language or 'auto'}:{digest}"
+
+
+transcript_cache = ResponseCache(
+    max_entries=TRANSCRIPT_CACHE_MAX_ENTRIES,
+    ttl=TRANSCRIPT_CACHE_TTL,
+    disk=SQLiteCacheTier(TRANSCRIPT_CACHE_DB_PATH, table="transcripts") if TRANSCRIPT_CACHE_DB_PATH else None,
+)
@@ -1,17 +1,16 @@
-import whisper
 from dotenv import load_dotenv
 from elevenlabs.client import ElevenLabs
 from elevenlabs import play, stream
 import os
+from transcriber import transcriber
 load_dotenv()
 
 
 def transcribe(path):
-
-    model = whisper.load_model("base")
-    result = model.transcribe()
-    transcribed_text = result["text"]
+    # Shared model: loaded on first use, not on every call
+    transcribed_text = transcriber.transcribe_file(path)
     print("Transcribed:", transcribed_text)
+    return transcribed_text
 
 
 def stt(ai_text):
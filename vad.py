@@ -0,0 +1,169 @@
+# vad.py
+
+import os
+from typing import List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SAMPLE_RATE = 16000
+
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() in ("1", "true", "yes")
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+# Speech must be this far above the clip's noise floor (its 10th percentile frame energy)...
+VAD_ENERGY_MARGIN_DB = float(os.getenv("VAD_ENERGY_MARGIN_DB", "12"))
+# ...and never quieter than this, so a clip of pure room tone isn't "all speech"
+VAD_MIN_ENERGY_DB = float(os.getenv("VAD_MIN_ENERGY_DB", "-55"))
+# A clip that is nearly all speech has no real noise floor; don't let its quietest speech set one
+VAD_MAX_NOISE_FLOOR_DB = float(os.getenv("VAD_MAX_NOISE_FLOOR_DB", "-50"))
+# Unvoiced consonants (s, f, sh) are quiet but noisy: accept frames this much below the
+# energy threshold when their zero-crossing rate is at least VAD_ZCR_THRESHOLD
+VAD_ZCR_RELIEF_DB = float(os.getenv("VAD_ZCR_RELIEF_DB", "8"))
+VAD_ZCR_THRESHOLD = float(os.getenv("VAD_ZCR_THRESHOLD", "0.25"))
+# Keep speech "on" this long after the last speech frame, so short pauses don't split words
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "300"))
+# Ignore bursts shorter than this (clicks, taps)
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "90"))
+# Context kept on both sides of each speech segment
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", "150"))
+# Longest chunk handed to the model; Whisper's context is 30 s, so longer chunks gain nothing
+VAD_MAX_CHUNK_SECONDS = float(os.getenv("VAD_MAX_CHUNK_SECONDS", "30"))
+
+Segment = Tuple[int, int]  # [start, end) in samples
+
+
+def _frames(audio: np.ndarray, frame: int) -> np.ndarray:
+    n = len(audio) // frame
+    return audio[:n * frame].reshape(n, frame)
+
+
+def frame_features(audio: np.ndarray, frame: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-frame energy (dB) and zero-crossing rate (crossings per sample)."""
+    frames = _frames(audio, frame)
+    energy = 10 * np.log10(np.einsum("ij,ij->i", frames, frames) / frame + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame
+    return energy, zcr
+
+
+def speech_segments(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> List[Segment]:
+    """Speech regions of mono float32 PCM, padded by VAD_PAD_MS and merged where they touch."""
+    frame = sample_rate * VAD_FRAME_MS // 1000
+    if len(audio) < frame:
+        return []
+    energy, zcr = frame_features(audio, frame)
+    noise_floor = min(float(np.percentile(energy, 10)), VAD_MAX_NOISE_FLOOR_DB)
+    threshold = max(VAD_MIN_ENERGY_DB, noise_floor + VAD_ENERGY_MARGIN_DB)
+    active = (energy > threshold) | ((energy > threshold - VAD_ZCR_RELIEF_DB) & (zcr >= VAD_ZCR_THRESHOLD))
+
+    hangover = max(1, VAD_HANGOVER_MS // VAD_FRAME_MS)
+    min_speech = max(1, VAD_MIN_SPEECH_MS // VAD_FRAME_MS)
+    pad = sample_rate * VAD_PAD_MS // 1000
+
+    segments: List[Segment] = []
+    start = None
+    run = silence = 0
+    for i, is_speech in enumerate(active):
+        if is_speech:
+            run += 1
+            silence = 0
+            if start is None and run >= min_speech:
+                start = i - run + 1
+        else:
+            run = 0
+            if start is not None:
+                silence += 1
+                if silence > hangover:
+                    segments.append((start, i - silence + 1))
+                    start = None
+                    silence = 0
+    if start is not None:
+        segments.append((start, len(active) - silence))
+
+    merged: List[Segment] = []
+    for s, e in segments:
+        s, e = max(0, s * frame - pad), min(len(audio), e * frame + pad)
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], e)
+        else:
+            merged.append((s, e))
+    return merged
+
+
+def quietest_cut(audio: np.ndarray, end: int, search: int, frame: int = SAMPLE_RATE // 10) -> int:
+    """Sample index in audio[end - search:end] at the centre of the lowest-energy frame."""
+    start = max(0, end - search)
+    n = (end - start) // frame
+    if n < 1:
+        return end
+    region = audio[start:start + n * frame].reshape(n, frame)
+    quietest = int(np.argmin(np.einsum("ij,ij->i", region, region)))
+    return start + quietest * frame + frame // 2
+
+
+def speech_windows(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, max_seconds: float = VAD_MAX_CHUNK_SECONDS,
+                   overlap: float = 0.0) -> List[Tuple[np.ndarray, bool]]:
+    """
+    The clip's speech grouped into windows of at most `max_seconds` that
+    break at pauses, each paired with whether it overlaps the previous one.
+    A segment longer than a window is split at its quietest moment, which
+    may still be inside a word, so the next window starts `overlap` seconds
+    before the cut and the caller de-duplicates the text both windows saw.
+    With the VAD disabled the whole clip counts as one segment.
+    """
+    limit = int(max_seconds * sample_rate)
+    # At most a quarter window, so every split still moves forward
+    back = min(int(overlap * sample_rate), limit // 4)
+    if VAD_ENABLED:
+        segments = speech_segments(audio, sample_rate)
+    else:
+        segments = [(0, len(audio))] if len(audio) else []
+    pieces: List[Tuple[np.ndarray, bool]] = []
+    for s, e in segments:
+        overlapped = False
+        while e - s > limit:
+            cut = quietest_cut(audio, s + limit, search=min(limit // 2, 3 * sample_rate))
+            pieces.append((audio[s:cut], overlapped))
+            s = cut - back
+            overlapped = back > 0
+        pieces.append((audio[s:e], overlapped))
+
+    windows: List[Tuple[np.ndarray, bool]] = []
+    group: List[np.ndarray] = []
+    size = 0
+    for piece, overlapped in pieces:
+        if group and (overlapped or size + len(piece) > limit):
+            windows.append((np.concatenate(group), group_overlapped))
+            group, size = [], 0
+        if not group:
+            group_overlapped = overlapped
+        group.append(piece)
+        size += len(piece)
+    if group:
+        windows.append((np.concatenate(group), group_overlapped))
+    return windows
+
+
+def speech_chunks(audio: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                  max_seconds: float = VAD_MAX_CHUNK_SECONDS) -> List[np.ndarray]:
+    """
+    The clip's speech with leading, trailing and long inner silences cut
+    out, grouped into chunks of at most `max_seconds` that break at pauses.
+    A single segment longer than that is split at its quietest moment.
+    Returns [] when there is no speech at all.
+    """
+    if not VAD_ENABLED:
+        return [audio] if len(audio) else []
+    return [chunk for chunk, _ in speech_windows(audio, sample_rate, max_seconds)]
+
+
+def trim(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Speech only, as one array (for audio already known to fit one chunk)."""
+    if not VAD_ENABLED:
+        return audio
+    segments = speech_segments(audio, sample_rate)
+    if not segments:
+        return audio[:0]
+    return np.concatenate([audio[s:e] for s, e in segments])